@@ -0,0 +1,44 @@
+"""
+Сравнение режимов аутентификации: Redis-сессия, Redis-сессия с кешем
+идентичности и подписанный токен (AUTH_MODE='token').
+
+Измеряется полное определение пользователя запроса через utils.identity_user.
+"""
+import argparse
+
+from common import measure, report, setup_django
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory, override_settings
+    from energycalc_apps.core import session_store, tokens, utils
+    from energycalc_apps.core.models import MyUser
+
+    user = MyUser.objects.create(username='benchmark-auth-modes')
+    factory = RequestFactory()
+
+    def resolver(session):
+        def resolve():
+            request = factory.get('/', HTTP_X_SESSION_ID=session)
+            assert utils.identity_user(request) is not None
+        return resolve
+
+    session = session_store.create(user.id)
+    try:
+        with override_settings(AUTH_MODE='session', IDENTITY_CACHE_ENABLED=False):
+            report("session (Redis + DB)", measure(resolver(session), args.iterations))
+        with override_settings(AUTH_MODE='session', IDENTITY_CACHE_ENABLED=True):
+            report("session + identity cache", measure(resolver(session), args.iterations))
+        with override_settings(AUTH_MODE='token'):
+            token = tokens.issue(user)
+            report("signed token", measure(resolver(token), args.iterations))
+    finally:
+        session_store.delete_all(user.id)
+        user.delete()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Пакетный расчет результатов (engine.calculate_all) против расчета по одной
+заявке: агрегирующий запрос calculate_base_consumption и save() на каждую.
+
+Создает --requests одобренных заявок по --devices устройств в каждой;
+поштучный путь измеряется на первых --legacy-requests из них. Перед замером
+проверяется, что оба пути дают одинаковые результаты. Созданные данные удаляются.
+"""
+import argparse
+import math
+import time
+
+from common import setup_django
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--legacy-requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from energycalc_apps.core import engine
+    from energycalc_apps.core.calculation import calculate_base_consumption, calculate_result
+    from energycalc_apps.core.models import CalculationRequest, Device, DeviceInRequest, MyUser
+
+    FORMED = CalculationRequest.CalculationRequestStatus.FORMED
+    user = MyUser.objects.create(username='benchmark-calculation-engine', is_moderator=True)
+    devices = Device.objects.bulk_create(
+        Device(name=f'benchmark-calculation-engine-{index}', category='benchmark', image_url='',
+               power=100, consumption=0.5 + index * 1.25, peak_power=100, voltage='220 В',
+               work_per_day='8 ч', energy_class='A')
+        for index in range(args.devices)
+    )
+    requests = CalculationRequest.objects.filter(client=user)
+    try:
+        CalculationRequest.objects.bulk_create(
+            (CalculationRequest(client=user, moderator=user, status=FORMED,
+                                residents=1 + index % 5, temperature=10 + index % 20)
+             for index in range(args.requests)),
+            batch_size=5000,
+        )
+        DeviceInRequest.objects.bulk_create(
+            (DeviceInRequest(calculation_request_id=request_id, device=device, quantity=1 + request_id % 3)
+             for request_id in requests.values_list('id', flat=True).iterator()
+             for device in devices),
+            batch_size=5000,
+        )
+
+        legacy = list(requests.order_by('id')[:args.legacy_requests])
+        started = time.perf_counter()
+        for calculation_request in legacy:
+            base = calculate_base_consumption(calculation_request)
+            calculation_request.result = math.floor(
+                calculate_result(base, calculation_request.residents, calculation_request.temperature) + 0.5
+            )
+            calculation_request.status = CalculationRequest.CalculationRequestStatus.COMPLETED
+            calculation_request.save(update_fields=['result', 'status'])
+        legacy_elapsed = time.perf_counter() - started
+        legacy_results = dict(requests.filter(id__in=[r.id for r in legacy]).values_list('id', 'result'))
+
+        requests.update(status=FORMED, result=None)
+        started = time.perf_counter()
+        processed = engine.calculate_all(engine.awaiting_results().filter(client=user))
+        engine_elapsed = time.perf_counter() - started
+        engine_results = dict(requests.filter(id__in=list(legacy_results)).values_list('id', 'result'))
+
+        if engine_results != legacy_results:
+            raise SystemExit("results differ")
+        print(f"results identical for {len(legacy_results)} requests")
+        print(f"{'per request':<20} {len(legacy) / legacy_elapsed:>10.0f} requests/s")
+        print(f"{'engine':<20} {processed / engine_elapsed:>10.0f} requests/s   "
+              f"({processed} requests in {engine_elapsed:.2f} s)")
+    finally:
+        DeviceInRequest.objects.filter(calculation_request__client=user).delete()
+        requests.delete()
+        Device.objects.filter(id__in=[device.id for device in devices]).delete()
+        user.delete()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Общие функции бенчмарков: настройка Django и статистика времени.
+
+Бенчмарки запускаются из корня репозитория, например:
+    python benchmarks/auth_modes.py
+Они работают с настроенными в settings БД и Redis и удаляют созданные данные.
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup_django():
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'energycalc_project.settings')
+    import django
+    django.setup()
+
+def measure(func, iterations):
+    """Время каждого из iterations вызовов func в секундах"""
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(name, durations):
+    total = sum(durations)
+    print(
+        f"{name:<40} {len(durations) / total:>12.0f} ops/s"
+        f"   p50 {percentile(durations, 0.5) * 1e6:>9.1f} us"
+        f"   p99 {percentile(durations, 0.99) * 1e6:>9.1f} us"
+    )
@@ -0,0 +1,50 @@
+"""
+Сериализация списка устройств: DeviceSerializer(many=True) против
+serialize_devices по словарям из .values().
+
+Данные строятся в памяти, поэтому измеряется только сериализация и рендеринг
+JSON, без БД. Перед замером проверяется, что оба пути дают одинаковые байты.
+"""
+import argparse
+
+from common import measure, setup_django
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from energycalc_apps.core.models import Device
+    from energycalc_apps.core.serializers import DEVICE_FIELDS, DeviceSerializer, serialize_devices
+
+    images = ['lamp.png', 'images/kettle.png', 'http://old-host:9000/images/fridge.png', '']
+    devices = [
+        Device(
+            id=index, name=f'Устройство {index}', category=f'Категория {index % 20}',
+            image_url=images[index % len(images)], power=index % 3000, consumption=index / 7,
+            peak_power=index % 4000, voltage='220 В', work_per_day='8 ч', energy_class='ABCDEFG'[index % 7],
+        )
+        for index in range(args.rows)
+    ]
+    rows = [{field: getattr(device, field) for field in DEVICE_FIELDS} for device in devices]
+    renderer = JSONRenderer()
+
+    def model_serializer():
+        return renderer.render(DeviceSerializer(devices, many=True).data)
+
+    def fast_path():
+        return renderer.render(serialize_devices(rows))
+
+    if model_serializer() != fast_path():
+        raise SystemExit("outputs differ")
+    print(f"outputs identical for {args.rows} rows")
+
+    for name, func in (("DeviceSerializer(many=True)", model_serializer), ("serialize_devices", fast_path)):
+        durations = measure(func, args.iterations)
+        print(f"{name:<30} {args.rows * len(durations) / sum(durations):>12.0f} rows/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Пропускная способность отправки заданий в сервис расчета на локальном stub-сервере.
+
+Сравниваются: requests.post на каждое задание (новое соединение, как до
+DispatchClient), DispatchClient по одному заданию с keep-alive и
+DispatchClient пачками по --batch-size. Stub отвечает 200 после --latency мс.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import setup_django
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело пишутся отдельно: без TCP_NODELAY keep-alive упирается в delayed ACK
+    disable_nagle_algorithm = True
+    latency = 0.0
+    calls = 0
+    calls_lock = threading.Lock()
+
+    def do_POST(self):
+        json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with StubHandler.calls_lock:
+            StubHandler.calls += 1
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=2.0, help="задержка ответа stub-сервера, мс")
+    args = parser.parse_args()
+
+    setup_django()
+    import requests
+    from energycalc_apps.core.dispatch import DispatchClient
+
+    StubHandler.latency = args.latency / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    payloads = [
+        {"request_id": index, "residents": 2, "temperature": 20,
+         "devices": [{"device": {"id": 1, "consumption": 1.5}, "quantity": 2}]}
+        for index in range(args.jobs)
+    ]
+
+    def run(name, send, batch_size):
+        StubHandler.calls = 0
+        batches = [payloads[i:i + batch_size] for i in range(0, len(payloads), batch_size)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            for outcomes in executor.map(send, batches):
+                assert all(outcome is None for outcome in outcomes), outcomes
+        elapsed = time.perf_counter() - started
+        print(f"{name:<32} {args.jobs / elapsed:>10.0f} jobs/s   {StubHandler.calls:>6} HTTP calls")
+
+    def post_each(batch):
+        for payload in batch:
+            requests.post(f'{base}/api/calculate', json=payload, timeout=5).raise_for_status()
+        return [None] * len(batch)
+
+    try:
+        run("requests.post per job", post_each, 1)
+        single = DispatchClient(url=f'{base}/api/calculate', batch_size=1, concurrency=args.concurrency)
+        run("DispatchClient, batch 1", single.send, 1)
+        batched = DispatchClient(url=f'{base}/api/calculate', batch_url=f'{base}/api/calculate/batch',
+                                 batch_size=args.batch_size, concurrency=args.concurrency)
+        run(f"DispatchClient, batch {args.batch_size}", batched.send, args.batch_size)
+    finally:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Задержка каталога (GET /api/devices/) во время шторма логинов.
+
+Сначала измеряется каталог без нагрузки, затем - пока несколько потоков
+непрерывно выполняют POST /api/users/login/. Логины сверх
+PASSWORD_HASHING_CONCURRENCY получают 503 и не занимают потоки хешированием.
+"""
+import argparse
+import threading
+from collections import Counter
+
+from common import measure, report, setup_django
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--logins', type=int, default=8, help="число потоков, выполняющих логин")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from energycalc_apps.core import session_store
+    from energycalc_apps.core.models import MyUser
+
+    user = MyUser.objects.create_user(username='benchmark-login-storm', password='benchmark-password')
+    catalog = Client()
+
+    def browse():
+        assert catalog.get('/api/devices/').status_code == 200
+
+    stop = threading.Event()
+    statuses = Counter()
+    statuses_lock = threading.Lock()
+
+    def login_loop():
+        client = Client()
+        try:
+            while not stop.is_set():
+                response = client.post(
+                    '/api/users/login/',
+                    {'username': user.username, 'password': 'benchmark-password'},
+                    content_type='application/json',
+                )
+                with statuses_lock:
+                    statuses[response.status_code] += 1
+        finally:
+            connection.close()
+
+    try:
+        report("catalog, idle", measure(browse, args.iterations))
+        threads = [threading.Thread(target=login_loop) for _ in range(args.logins)]
+        for thread in threads:
+            thread.start()
+        try:
+            report(f"catalog, {args.logins} login threads", measure(browse, args.iterations))
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        print("login responses:", dict(sorted(statuses.items())))
+    finally:
+        session_store.delete_all(user.id)
+        user.delete()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Пиковая память и время до первых данных (TTFB) для списка устройств:
+полный список в памяти против потоковой отдачи (?stream=1) без сжатия и с gzip.
+
+Для каждого размера в каталог добавляются устройства отдельной категории,
+каждый замер выполняется в отдельном процессе, чтобы ru_maxrss отражал
+только его. Созданные устройства удаляются в конце.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import setup_django
+
+CATEGORY_PREFIX = 'benchmark-streaming-'
+MODES = ('buffered', 'stream', 'stream+gzip')
+
+def seed(sizes):
+    from energycalc_apps.core.models import Device
+
+    for size in sizes:
+        category = f'{CATEGORY_PREFIX}{size}'
+        if Device.objects.filter(category=category).exists():
+            continue
+        for start in range(0, size, 10000):
+            Device.objects.bulk_create(
+                Device(name=f'{category}-{index}', category=category, image_url=f'{index}.png',
+                       power=index % 3000, consumption=1.5, peak_power=index % 4000, voltage='220 В',
+                       work_per_day='8 ч', energy_class='A', voltage_volts=220, hours_per_day=8)
+                for index in range(start, min(size, start + 10000))
+            )
+
+def run_child(size, mode):
+    from django.test import Client
+    from rest_framework.renderers import JSONRenderer
+    from energycalc_apps.core.models import Device
+    from energycalc_apps.core.serializers import DEVICE_FIELDS, serialize_devices
+
+    category = f'{CATEGORY_PREFIX}{size}'
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == 'buffered':
+        # Прежний путь: вся выборка и весь JSON в памяти
+        rows = list(Device.objects.filter(category=category).order_by('name', 'id').values(*DEVICE_FIELDS))
+        body = JSONRenderer().render(serialize_devices(rows))
+        first_byte = time.perf_counter()
+        total_bytes = len(body)
+    else:
+        headers = {'HTTP_ACCEPT_ENCODING': 'gzip'} if mode == 'stream+gzip' else {}
+        response = Client().get(f'/api/devices/?stream=1&category={category}', **headers)
+        first_byte = None
+        total_bytes = 0
+        for chunk in response.streaming_content:
+            # Первая часть с данными, а не '[' или заголовок gzip
+            if first_byte is None and len(chunk) > 32:
+                first_byte = time.perf_counter()
+            total_bytes += len(chunk)
+        first_byte = first_byte or time.perf_counter()
+    finished = time.perf_counter()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{size:>9} {mode:<12} ttfb {(first_byte - started) * 1000:>9.1f} ms"
+          f"   total {(finished - started) * 1000:>9.1f} ms"
+          f"   peak rss +{(peak - baseline) / 1024:>8.1f} MiB   {total_bytes / 1e6:>8.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--keep', action='store_true', help="не удалять созданные устройства")
+    parser.add_argument('--child', nargs=2, metavar=('SIZE', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    setup_django()
+    if args.child:
+        run_child(int(args.child[0]), args.child[1])
+        return
+
+    from django.db import connection
+
+    seed(args.sizes)
+    try:
+        for size in args.sizes:
+            for mode in MODES:
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(size), mode], check=True)
+    finally:
+        if not args.keep:
+            # Строки бенчмарка ни на что не ссылаются, удаляем без загрузки в память
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM device WHERE category LIKE %s", [f'{CATEGORY_PREFIX}%'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class CoreConfig(AppConfig):
+    name = 'energycalc_apps.core'
+    label = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,15 @@
+from rest_framework import authentication
+from .utils import identity_user, get_session
+
+class RedisSessionAuthentication(authentication.BaseAuthentication):
+    """
+    Аутентификация по session_id (cookie или заголовок X-Session-ID).
+
+    Пользователь определяется один раз за запрос и доступен как request.user
+    для классов прав доступа и представлений.
+    """
+    def authenticate(self, request):
+        user = identity_user(request)
+        if user is None:
+            return None
+        return (user, get_session(request))
@@ -0,0 +1,60 @@
+from django.db.models import F, FloatField, Sum
+
+from .models import DeviceInRequest
+
+BASE_TEMPERATURE = 20
+TEMPERATURE_FACTOR = 0.01
+RESIDENT_FACTOR = 0.3
+
+def calculate_result(base_consumption, residents, temperature):
+    """
+    Итоговое потребление по формуле заявки:
+    base × (1 + |20 − T| · 0.01 + (residents − 1) · 0.3)
+    
+    Возвращает float, округление выполняет вызывающий код.
+    """
+    return base_consumption * (
+        1
+        + abs(BASE_TEMPERATURE - temperature) * TEMPERATURE_FACTOR
+        + (residents - 1) * RESIDENT_FACTOR
+    )
+
+def calculate_base_consumption(calculation_request):
+    """Суммарное потребление устройств заявки одним агрегирующим запросом"""
+    total = DeviceInRequest.objects.filter(calculation_request=calculation_request).aggregate(
+        total=Sum(F('device__consumption') * F('quantity'), output_field=FloatField())
+    )['total']
+    return total or 0
+
+def build_service_payloads(requests):
+    """
+    Данные для сервиса расчета по нескольким заявкам сразу.
+    
+    requests - последовательность (id, residents, temperature). Строки
+    устройств всех заявок загружаются одним запросом. Возвращает словарь
+    {id заявки: payload}.
+    """
+    payloads = {
+        request_id: {
+            "request_id": request_id,
+            "residents": residents,
+            "temperature": temperature,
+            "devices": []
+        }
+        for request_id, residents, temperature in requests
+    }
+    device_lines = DeviceInRequest.objects.filter(
+        calculation_request_id__in=list(payloads)
+    ).order_by('calculation_request_id', 'id').values_list(
+        'calculation_request_id', 'device_id', 'device__consumption', 'quantity'
+    )
+    
+    for request_id, device_id, consumption, quantity in device_lines:
+        payloads[request_id]["devices"].append({
+            "device": {
+                "id": device_id,
+                "consumption": float(consumption)
+            },
+            "quantity": quantity
+        })
+    return payloads
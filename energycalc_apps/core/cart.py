@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+
+from .models import CalculationRequest, Device, DeviceInRequest
+from .redis import session_storage
+
+SUMMARY_PREFIX = 'cart:summary:'
+GENERATION_PREFIX = 'cart:generation:'
+
+# Сброс сводки: следующее чтение восстановит ее из БД. Поколение отклоняет
+# запись сводки, прочитанной из БД до этого изменения (см. _FILL)
+_RESET = session_storage.register_script("""
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[1])
+""")
+
+# Запись сводки, прочитанной из БД, если с момента чтения поколение не менялось
+_FILL = session_storage.register_script("""
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'draft_id', ARGV[2], 'count', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+""")
+
+def _keys(user_id):
+    return [f"{SUMMARY_PREFIX}{user_id}", f"{GENERATION_PREFIX}{user_id}"]
+
+def reset(user_id):
+    """
+    Сбрасывает сводку корзины после фиксации транзакции при любом изменении корзины.
+    
+    Сводка не изменяется на месте: чтение, успевшее увидеть новое состояние БД
+    и записать его до этого сброса, иначе было бы изменено повторно.
+    """
+    def apply():
+        try:
+            _RESET(keys=_keys(user_id), args=[settings.CART_SUMMARY_TTL])
+        except Exception as e:
+            print(f"Error resetting cart summary for user {user_id}: {e}")
+    transaction.on_commit(apply)
+
+def summary(user_id):
+    """
+    Возвращает (id заявки-черновика или None, число устройств в ней).
+    
+    При попадании в кеш запросов к БД нет. При промахе сводка читается из БД
+    одним запросом и записывается в Redis, только если за это время корзина
+    не менялась (иначе следующий вызов прочитает ее заново).
+    """
+    keys = _keys(user_id)
+    try:
+        pipe = session_storage.pipeline()
+        pipe.hmget(keys[0], 'draft_id', 'count')
+        pipe.get(keys[1])
+        (draft_id, count), generation = pipe.execute()
+        if count is not None:
+            return (int(draft_id) if draft_id else None), int(count)
+    except Exception as e:
+        print(f"Error reading cart summary for user {user_id}: {e}")
+        return _load(user_id)
+    
+    draft_id, count = _load(user_id)
+    try:
+        _FILL(
+            keys=keys,
+            args=[generation or b'', draft_id or '', count, settings.CART_SUMMARY_TTL],
+        )
+    except Exception as e:
+        print(f"Error storing cart summary for user {user_id}: {e}")
+    return draft_id, count
+
+def _load(user_id):
+    draft = CalculationRequest.objects.filter(
+        client_id=user_id,
+        status=CalculationRequest.CalculationRequestStatus.DRAFT
+    ).annotate(devices_count=Count('deviceinrequest')).values_list('id', 'devices_count').first()
+    return draft if draft else (None, 0)
+
+def get_or_create_draft(user):
+    """
+    Заявка-черновик пользователя, созданная при необходимости.
+    
+    Единственность черновика обеспечивает частичный уникальный индекс
+    calcrequest_one_draft_per_client: при гонке второй INSERT падает
+    внутри savepoint, и черновик перечитывается. Возвращает (заявка, создана ли).
+    """
+    draft_request = CalculationRequest.objects.filter(
+        client=user,
+        status=CalculationRequest.CalculationRequestStatus.DRAFT
+    ).first()
+    if draft_request:
+        draft_request.client = user
+        return draft_request, False
+    
+    try:
+        with transaction.atomic():
+            return CalculationRequest.objects.create(
+                client=user,
+                status=CalculationRequest.CalculationRequestStatus.DRAFT,
+                residents=1,
+                temperature=20,
+                result=None
+            ), True
+    except IntegrityError:
+        draft_request = CalculationRequest.objects.get(
+            client=user,
+            status=CalculationRequest.CalculationRequestStatus.DRAFT
+        )
+        draft_request.client = user
+        return draft_request, False
+
+def add_device(draft_request_id, device_id):
+    """
+    Добавляет устройство в черновик или увеличивает его количество одним запросом.
+    
+    INSERT ... SELECT из таблицы устройств проверяет существование устройства,
+    ON CONFLICT атомарно увеличивает quantity. Возвращает True, если строка
+    создана, False, если количество увеличено, и None, если устройства нет.
+    """
+    line_table = connection.ops.quote_name(DeviceInRequest._meta.db_table)
+    device_table = connection.ops.quote_name(Device._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {line_table} (calculation_request_id, device_id, quantity)
+            SELECT %s, id, 1 FROM {device_table} WHERE id = %s
+            ON CONFLICT (calculation_request_id, device_id)
+            DO UPDATE SET quantity = {line_table}.quantity + 1
+            RETURNING (xmax = 0)
+            """,
+            [draft_request_id, device_id],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def apply_changes(draft_request, items, remove):
+    """
+    Применяет к черновику пакет изменений фиксированным числом запросов.
+    
+    items - список {"device_id", "quantity"}: строки создаются или получают
+    новое количество одним bulk_create(update_conflicts=True), remove - id
+    устройств, удаляемых одним DELETE. Возвращает отсортированный список
+    id несуществующих устройств (тогда ничего не меняется).
+    """
+    device_ids = {item['device_id'] for item in items}
+    if device_ids:
+        missing = device_ids - set(Device.objects.filter(id__in=device_ids).values_list('id', flat=True))
+        if missing:
+            return sorted(missing)
+    
+    if remove:
+        DeviceInRequest.objects.filter(calculation_request=draft_request, device_id__in=remove).delete()
+    if items:
+        DeviceInRequest.objects.bulk_create(
+            [
+                DeviceInRequest(
+                    calculation_request=draft_request,
+                    device_id=item['device_id'],
+                    quantity=item['quantity'],
+                )
+                for item in items
+            ],
+            update_conflicts=True,
+            unique_fields=['calculation_request', 'device'],
+            update_fields=['quantity'],
+        )
+    return []
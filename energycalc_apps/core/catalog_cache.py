@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .redis import session_storage
+from .streaming import is_streaming_requested
+
+VERSION_KEY = 'catalog:version'
+ENTRY_PREFIX = 'catalog:response:'
+
+class CatalogCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+    def record(self, kind, saved=0):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+            self.bytes_saved += saved
+
+    def as_dict(self):
+        with self._lock:
+            served = self.hits + self.not_modified
+            lookups = served + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_ratio": served / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
+
+_stats = CatalogCacheStats()
+
+def bump_version():
+    """Инвалидирует все закешированные ответы каталога"""
+    try:
+        session_storage.incr(VERSION_KEY)
+    except Exception as e:
+        print(f"Error bumping catalog version: {e}")
+
+def stats():
+    result = _stats.as_dict()
+    result["enabled"] = settings.CATALOG_CACHE_ENABLED
+    return result
+
+def cached_response(view_func):
+    """
+    Кеширует JSON-ответ представления каталога в Redis.
+
+    Ключ строится из версии каталога и нормализованного URL запроса,
+    ETag - хеш тела ответа. 304 отдается, только если If-None-Match
+    совпадает с ETag актуального тела: закешированного или, если запись
+    истекла, заново построенного представлением.
+    Версия увеличивается при любом изменении каталога (bump_version).
+    Потоковые ответы не кешируются; при недоступности Redis запрос
+    обрабатывается представлением напрямую.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not settings.CATALOG_CACHE_ENABLED or is_streaming_requested(request):
+            return view_func(request, *args, **kwargs)
+        
+        try:
+            version = int(session_storage.get(VERSION_KEY) or 0)
+        except Exception as e:
+            print(f"Error reading catalog version: {e}")
+            return view_func(request, *args, **kwargs)
+        
+        entry_key = f"{ENTRY_PREFIX}{version}:{_cache_key(request)}"
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        
+        try:
+            body = session_storage.get(entry_key)
+        except Exception as e:
+            print(f"Error reading catalog cache: {e}")
+            return view_func(request, *args, **kwargs)
+        if body is not None:
+            return _respond(body, client_etags, 'hits')
+        
+        response = view_func(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            _stats.record('misses')
+            return response
+        
+        body = JSONRenderer().render(response.data)
+        try:
+            session_storage.set(entry_key, body, ex=settings.CATALOG_CACHE_TTL)
+        except Exception as e:
+            print(f"Error writing catalog cache: {e}")
+        return _respond(body, client_etags, 'misses')
+    
+    return wrapper
+
+def _respond(body, client_etags, kind):
+    etag = _etag(body)
+    if etag in client_etags:
+        _stats.record('not_modified', len(body))
+        return _with_etag(HttpResponseNotModified(), etag)
+    _stats.record(kind)
+    return _with_etag(HttpResponse(body, content_type='application/json'), etag)
+
+def _etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def _cache_key(request):
+    # Ссылки пагинации абсолютные, поэтому схема и хост входят в ключ
+    query = sorted(request.GET.lists())
+    raw = f"{request.scheme}://{request.get_host()}{request.path}?{query}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def _with_etag(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
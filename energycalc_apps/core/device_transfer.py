@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+import re
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from .models import Device
+from . import result_cache
+
+TRANSFER_FIELDS = ('name', 'category', 'image_url', 'power', 'consumption',
+                   'peak_power', 'voltage', 'work_per_day', 'energy_class')
+UPDATE_FIELDS = [f for f in TRANSFER_FIELDS if f != 'name'] + ['voltage_volts', 'hours_per_day']
+FORMATS = ('csv', 'ndjson')
+
+# Байты, не являющиеся UTF-8, при чтении с errors='surrogateescape' становятся
+# одиночными суррогатами, которых не бывает в корректно декодированном тексте
+UNDECODABLE = re.compile('[\udc80-\udcff]')
+
+class DeviceImportSerializer(serializers.ModelSerializer):
+    image_url = serializers.CharField(max_length=500, required=False, allow_blank=True, default='')
+    
+    class Meta:
+        model = Device
+        fields = list(TRANSFER_FIELDS)
+        # Существующее название - это обновление, а не ошибка
+        extra_kwargs = {'name': {'validators': []}}
+        validators = []
+
+def detect_format(filename, requested=None):
+    if requested:
+        return requested if requested in FORMATS else None
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return None
+
+def iter_records(stream, file_format):
+    """
+    Построчно читает CSV или NDJSON из бинарного потока.
+    
+    Возвращает пары (номер строки, запись); для строк, которые не удалось
+    разобрать (в том числе с байтами не в UTF-8), вместо записи возвращается ValueError.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='surrogateescape', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield reader.line_num, ValueError(f"Invalid CSV: {e}")
+                continue
+            if any(UNDECODABLE.search(value) for value in row.values() if isinstance(value, str)):
+                yield reader.line_num, ValueError("Invalid UTF-8")
+                continue
+            yield reader.line_num, row
+    
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if UNDECODABLE.search(line):
+            yield line_number, ValueError("Invalid UTF-8")
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError("Expected JSON object")
+            continue
+        yield line_number, record
+
+def import_devices(records, chunk_size=None):
+    """
+    Импортирует устройства пачками с upsert по названию устройства.
+    
+    Каждая пачка проверяется сериализатором, затем записывается одним
+    INSERT ... ON CONFLICT (name) DO UPDATE в отдельной транзакции, поэтому
+    параллельные импорты не создают дубликатов. Ошибки отдельных строк
+    не прерывают импорт и попадают в отчет (не более DEVICE_IMPORT_MAX_ERRORS).
+    """
+    chunk_size = chunk_size or settings.DEVICE_IMPORT_CHUNK_SIZE
+    report = {"total": 0, "created": 0, "updated": 0, "error_count": 0, "errors": []}
+    
+    chunk = []
+    for line_number, record in records:
+        report["total"] += 1
+        chunk.append((line_number, record))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, report)
+    
+    return report
+
+def _import_chunk(chunk, report):
+    valid = {}
+    for line_number, record in chunk:
+        if isinstance(record, ValueError):
+            _add_error(report, line_number, str(record))
+            continue
+        serializer = DeviceImportSerializer(data=record)
+        if not serializer.is_valid():
+            _add_error(report, line_number, serializer.errors)
+            continue
+        # При повторе названия внутри пачки побеждает последняя строка
+        valid[serializer.validated_data['name']] = serializer.validated_data
+    
+    if not valid:
+        return
+    
+    devices = []
+    for data in valid.values():
+        device = Device(**data)
+        # bulk_create не вызывает save(), числовые поля заполняем явно
+        device.fill_numeric_attributes()
+        devices.append(device)
+    
+    with transaction.atomic():
+        # Только для отчета: строку, созданную параллельным импортом, upsert все равно обновит
+        existing = set(Device.objects.filter(name__in=list(valid)).values_list('name', flat=True))
+        Device.objects.bulk_create(
+            devices, update_conflicts=True, unique_fields=['name'], update_fields=UPDATE_FIELDS
+        )
+        # Потребление могло измениться: закешированные результаты с этими устройствами устарели
+        updated_ids = [device.id for device in devices if device.name in existing]
+        transaction.on_commit(lambda: result_cache.invalidate_devices(updated_ids))
+    
+    report["created"] += len(devices) - len(updated_ids)
+    report["updated"] += len(updated_ids)
+
+def _add_error(report, line_number, errors):
+    report["error_count"] += 1
+    if len(report["errors"]) < settings.DEVICE_IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": line_number, "errors": errors})
+
+def export_devices(file_format, chunk_size=None):
+    """Итератор байтов с выгрузкой всего каталога в CSV или NDJSON"""
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    rows = Device.objects.order_by('id').values_list(*TRANSFER_FIELDS).iterator(chunk_size=chunk_size)
+    
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(TRANSFER_FIELDS)
+    
+    written = 0
+    for row in rows:
+        if file_format == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(TRANSFER_FIELDS, row)), ensure_ascii=False))
+            buffer.write('\n')
+        written += 1
+        if written % chunk_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
@@ -0,0 +1,154 @@
+import functools
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+class CircuitOpenError(Exception):
+    """Сервис расчета временно недоступен, вызовы не выполняются"""
+
+class RejectedError(Exception):
+    """Сервис расчета отклонил задание (ответ 4xx)"""
+
+# Ответы 4xx, означающие перегрузку сервиса, а не ошибку в задании
+RETRYABLE_STATUSES = (408, 429)
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи: после failure_threshold ошибок подряд вызовы отклоняются
+    на reset_timeout секунд, затем пропускается один пробный вызов.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def is_open(self):
+        return self.state() == "open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError("Calculation service circuit is open")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+class DispatchClient:
+    """
+    Клиент сервиса расчета с пулом keep-alive соединений.
+    
+    При batch_size > 1 задания отправляются списком на CALCULATION_SERVICE_BATCH_URL,
+    при batch_size == 1 - по одному на CALCULATION_SERVICE_URL, как раньше.
+    """
+    def __init__(self, url=None, batch_url=None, batch_size=None, concurrency=None, timeout=None):
+        self.url = url or settings.CALCULATION_SERVICE_URL
+        self.batch_url = batch_url or settings.CALCULATION_SERVICE_BATCH_URL
+        self.batch_size = batch_size or settings.CALCULATION_SERVICE_BATCH_SIZE
+        self.timeout = timeout or (settings.CALCULATION_SERVICE_CONNECT_TIMEOUT, settings.CALCULATION_SERVICE_TIMEOUT)
+        concurrency = concurrency or settings.OUTBOX_WORKER_CONCURRENCY
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.breaker = CircuitBreaker(
+            settings.CALCULATION_SERVICE_FAILURE_THRESHOLD,
+            settings.CALCULATION_SERVICE_RESET_TIMEOUT,
+        )
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._failures = 0
+        self._payloads = 0
+
+    def is_available(self):
+        return not self.breaker.is_open()
+
+    def send(self, payloads):
+        """
+        Отправляет пачку заданий (не больше batch_size).
+        
+        Возвращает список исходов по заданиям в том же порядке: None - задание
+        принято, иначе исключение. Если batch-вызов отклонен с 4xx, задания
+        отправляются по одному, чтобы одно некорректное задание не проваливало
+        остальные. Недоступность сервиса при batch-вызове (сеть, 5xx, 408/429)
+        выбрасывается для всей пачки.
+        """
+        if self.batch_size > 1 and len(payloads) > 1:
+            if self._post(self.batch_url, payloads, len(payloads)) is None:
+                return [None] * len(payloads)
+        
+        outcomes = []
+        for payload in payloads:
+            try:
+                outcomes.append(self._post(self.url, payload, 1))
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    def _post(self, url, body, payload_count):
+        """Один HTTP-вызов: возвращает RejectedError для 4xx или None, остальные ошибки выбрасывает"""
+        self.breaker.before_call()
+        try:
+            response = self.session.post(url, json=body, timeout=self.timeout)
+            if response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+                response.raise_for_status()
+        except requests.RequestException:
+            self.breaker.record_failure()
+            self._count(payload_count, failed=True)
+            raise
+        # Сервис ответил: 4xx относится к заданию, а не к доступности сервиса
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            self._count(payload_count, failed=True)
+            return RejectedError(f"{response.status_code} {response.reason}: {response.text[:200]}")
+        self._count(payload_count)
+        return None
+
+    def _count(self, payload_count, failed=False):
+        with self._lock:
+            self._calls += 1
+            self._payloads += payload_count
+            if failed:
+                self._failures += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "failures": self._failures,
+                "payloads": self._payloads,
+                "circuit": self.breaker.state(),
+            }
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """Общий клиент процесса"""
+    return DispatchClient()
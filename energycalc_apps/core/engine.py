@@ -0,0 +1,108 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import result_cache
+from .calculation import calculate_result
+from .models import CalculationJob, CalculationRequest, DeviceInRequest
+
+def awaiting_results():
+    """Одобренные модератором заявки, для которых еще не получен результат"""
+    return CalculationRequest.objects.filter(
+        status=CalculationRequest.CalculationRequestStatus.FORMED,
+        moderator__isnull=False,
+    )
+
+def calculate_batch(requests):
+    """
+    Рассчитывает результаты для пачки заявок и сохраняет их со статусом COMPLETED.
+    
+    Строки DeviceInRequest всех заявок загружаются одним запросом, базовое
+    потребление считается сегментными суммами (np.bincount), формула
+    calculate_result применяется к массивам целиком. Неотправленные задания
+    outbox этих заявок закрываются, чтобы сервис расчета не перезаписал
+    результат. Результаты кешируются по отпечатку заявки, как и полученные
+    от сервиса. Возвращает число обновленных заявок.
+    """
+    with transaction.atomic():
+        rows = list(requests.select_for_update(of=('self',)).values_list('id', 'residents', 'temperature'))
+        if not rows:
+            return 0
+        
+        request_ids, residents, temperature = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        
+        lines = list(DeviceInRequest.objects.filter(
+            calculation_request_id__in=request_ids.tolist()
+        ).values_list('calculation_request_id', 'device_id', 'device__consumption', 'quantity'))
+        
+        base = np.zeros(len(rows))
+        if lines:
+            line_request_ids, _, consumption, quantity = (np.array(column) for column in zip(*lines))
+            order = np.argsort(request_ids)
+            positions = order[np.searchsorted(request_ids[order], line_request_ids)]
+            base = np.bincount(
+                positions,
+                weights=consumption.astype(np.float64) * quantity,
+                minlength=len(rows),
+            )
+        
+        # Половины округляются вверх, как в сервисе расчета (np.rint округлил бы 2.5 до 2)
+        results = np.floor(calculate_result(base, residents, temperature) + 0.5).astype(np.int64)
+        
+        CalculationRequest.objects.bulk_update(
+            [
+                CalculationRequest(
+                    id=request_id,
+                    result=result,
+                    status=CalculationRequest.CalculationRequestStatus.COMPLETED,
+                )
+                for request_id, result in zip(request_ids.tolist(), results.tolist())
+            ],
+            ['result', 'status'],
+            batch_size=settings.CALCULATION_ENGINE_UPDATE_BATCH_SIZE,
+        )
+        CalculationJob.objects.filter(
+            calculation_request_id__in=request_ids.tolist(),
+            status__in=[CalculationJob.CalculationJobStatus.PENDING, CalculationJob.CalculationJobStatus.DEAD],
+        ).update(status=CalculationJob.CalculationJobStatus.DONE, locked_until=None)
+        if settings.RESULT_CACHE_ENABLED:
+            entries = _cache_entries(rows, lines, results.tolist())
+            transaction.on_commit(lambda: result_cache.store_many(entries))
+    return len(rows)
+
+def _cache_entries(rows, lines, results):
+    # Те же данные, что уходят в сервис расчета, чтобы отпечатки совпадали
+    payloads = {
+        request_id: {"residents": residents, "temperature": temperature, "devices": []}
+        for request_id, residents, temperature in rows
+    }
+    for request_id, device_id, consumption, quantity in lines:
+        payloads[request_id]["devices"].append({
+            "device": {"id": device_id, "consumption": float(consumption)},
+            "quantity": quantity,
+        })
+    return [
+        (
+            result_cache.fingerprint(payload),
+            [line["device"]["id"] for line in payload["devices"]],
+            result,
+        )
+        for payload, result in zip(payloads.values(), results)
+    ]
+
+def calculate_all(requests=None, batch_size=None):
+    """Обрабатывает заявки пачками по batch_size в порядке id, возвращает общее число"""
+    requests = awaiting_results() if requests is None else requests
+    batch_size = batch_size or settings.CALCULATION_ENGINE_BATCH_SIZE
+    
+    processed = 0
+    last_id = 0
+    while True:
+        batch_ids = list(
+            requests.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch_ids:
+            break
+        processed += calculate_batch(requests.filter(id__in=batch_ids))
+        last_id = batch_ids[-1]
+    return processed
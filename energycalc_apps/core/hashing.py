@@ -0,0 +1,39 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import hashers
+
+class HasherBusy(Exception):
+    """Все слоты хеширования паролей заняты, запрос нужно повторить позже"""
+
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_CONCURRENCY)
+
+@contextmanager
+def admission():
+    """
+    Ограничивает число одновременных хеширований паролей в процессе.
+
+    Хеширование выполняется в потоке запроса; при превышении лимита сразу
+    выбрасывается HasherBusy, чтобы login/register не занимали все потоки
+    воркера и остальные эндпоинты продолжали обслуживаться.
+    """
+    if not _slots.acquire(blocking=False):
+        raise HasherBusy()
+    try:
+        yield
+    finally:
+        _slots.release()
+
+def make_password(password):
+    with admission():
+        return hashers.make_password(password)
+
+def authenticate(request, username, password):
+    """
+    django.contrib.auth.authenticate под ограничением admission():
+    учитываются AUTHENTICATION_BACKENDS и сигнал user_login_failed.
+    """
+    with admission():
+        return auth.authenticate(request, username=username, password=password)
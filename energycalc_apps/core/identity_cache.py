@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .redis import session_storage
+
+INVALIDATION_CHANNEL = 'identity:invalidate'
+
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'username', 'is_moderator'])
+
+class IdentityCache:
+    """
+    LRU/TTL кеш session_id -> UserSnapshot внутри одного процесса.
+
+    Инвалидация между процессами выполняется через Redis pub/sub:
+    каждый процесс подписан на INVALIDATION_CHANNEL и удаляет записи
+    при получении сообщения "session:<id>" или "user:<id>".
+    Другие модули могут подписаться на свои типы сообщений через register_handler.
+
+    Инвалидация оставляет метку времени (tombstone) на ttl секунд: запись,
+    прочитанная из Redis до инвалидации, но сохраняемая после нее, отклоняется.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._sessions_by_user = {}
+        self._session_tombstones = OrderedDict()
+        self._user_tombstones = OrderedDict()
+        self._cleared_at = float('-inf')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, session):
+        with self._lock:
+            entry = self._entries.get(session)
+            if entry is None:
+                self.misses += 1
+                return None
+            snapshot, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(session)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session)
+            self.hits += 1
+            return snapshot
+
+    def set(self, session, snapshot, since):
+        """
+        Сохраняет снимок, прочитанный начиная с момента since (time.monotonic()).
+
+        Если после since сессия или пользователь были инвалидированы, снимок
+        мог устареть и не сохраняется.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._prune_tombstones(now)
+            if (
+                since < now - self.ttl
+                or since <= self._cleared_at
+                or self._session_tombstones.get(session, float('-inf')) >= since
+                or self._user_tombstones.get(snapshot.id, float('-inf')) >= since
+            ):
+                return
+            if session in self._entries:
+                self._remove(session)
+            self._entries[session] = (snapshot, time.monotonic() + self.ttl)
+            self._sessions_by_user.setdefault(snapshot.id, set()).add(session)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def evict_session(self, session):
+        with self._lock:
+            self._tombstone(self._session_tombstones, session)
+            if session in self._entries:
+                self._remove(session)
+                self.invalidations += 1
+
+    def evict_user(self, user_id):
+        with self._lock:
+            self._tombstone(self._user_tombstones, user_id)
+            for session in list(self._sessions_by_user.get(user_id, ())):
+                self._remove(session)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sessions_by_user.clear()
+            self._session_tombstones.clear()
+            self._user_tombstones.clear()
+            self._cleared_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _tombstone(self, tombstones, key):
+        tombstones.pop(key, None)
+        tombstones[key] = time.monotonic()
+
+    def _prune_tombstones(self, now):
+        # Метки добавляются в порядке времени, устаревшие всегда в начале
+        for tombstones in (self._session_tombstones, self._user_tombstones):
+            while tombstones and next(iter(tombstones.values())) < now - self.ttl:
+                tombstones.popitem(last=False)
+
+    def _remove(self, session):
+        snapshot, _ = self._entries.pop(session)
+        sessions = self._sessions_by_user.get(snapshot.id)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self._sessions_by_user[snapshot.id]
+
+_cache = IdentityCache(settings.IDENTITY_CACHE_MAX_SIZE, settings.IDENTITY_CACHE_TTL)
+_listener = None
+_listener_lock = threading.Lock()
+_handlers = {}
+
+def register_handler(kind, on_message, on_reset=None):
+    """
+    Регистрирует обработчик сообщений "<kind>:<value>" канала инвалидации.
+
+    on_reset вызывается при каждой (пере)подписке, так как сообщения,
+    отправленные до нее, могли быть пропущены.
+    """
+    _handlers[kind] = (on_message, on_reset)
+
+def enabled():
+    return settings.IDENTITY_CACHE_ENABLED
+
+def begin():
+    """Момент начала чтения сессии из Redis, передается в store()"""
+    return time.monotonic()
+
+def lookup(session):
+    ensure_listener()
+    return _cache.get(session)
+
+def store(session, user, since):
+    ensure_listener()
+    _cache.set(session, UserSnapshot(user.id, user.username, user.is_moderator), since)
+
+def build_user(snapshot):
+    """
+    Создает экземпляр MyUser из снимка без обращения к БД.
+
+    Поля, которых нет в снимке, отложены (deferred): при обращении они
+    загружаются из БД, а save() обновляет только загруженные поля и не
+    затирает остальные колонки.
+    """
+    from .models import MyUser
+
+    return MyUser.from_db(
+        'default',
+        ['id', 'username', 'is_moderator'],
+        [snapshot.id, snapshot.username, snapshot.is_moderator],
+    )
+
+def invalidate_session(session):
+    if enabled():
+        publish(f"session:{session}")
+
+def invalidate_user(user_id):
+    if enabled():
+        publish(f"user:{user_id}")
+
+def stats():
+    result = _cache.stats()
+    result["enabled"] = enabled()
+    return result
+
+def publish(message):
+    _handle_message(message)
+    try:
+        session_storage.publish(INVALIDATION_CHANNEL, message)
+    except Exception as e:
+        print(f"Error publishing identity invalidation: {e}")
+
+def _handle_message(message):
+    if isinstance(message, bytes):
+        message = message.decode('utf-8')
+    kind, _, value = message.partition(':')
+    handler = _handlers.get(kind)
+    if handler is not None:
+        handler[0](value)
+
+def _evict_user(value):
+    try:
+        _cache.evict_user(int(value))
+    except ValueError:
+        pass
+
+def _reset():
+    for _, on_reset in _handlers.values():
+        if on_reset is not None:
+            try:
+                on_reset()
+            except Exception as e:
+                print(f"Identity cache reset error: {e}")
+
+register_handler('session', _cache.evict_session, _cache.clear)
+register_handler('user', _evict_user)
+
+def ensure_listener():
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen, name='identity-cache-listener', daemon=True)
+        _listener.start()
+
+def _listen():
+    while True:
+        pubsub = session_storage.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Сообщения, пропущенные до подписки, неизвестны - сбрасываем состояние
+            _reset()
+            for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    _handle_message(message['data'])
+        except Exception as e:
+            print(f"Identity cache listener error: {e}")
+        finally:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+        _cache.clear()
+        time.sleep(1)
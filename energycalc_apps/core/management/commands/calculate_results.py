@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from energycalc_apps.core.engine import awaiting_results, calculate_all
+from energycalc_apps.core.models import CalculationRequest
+
+class Command(BaseCommand):
+    help = "Локальный пакетный расчет результатов заявок"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--include-unapproved', action='store_true',
+            help="Рассчитать все заявки в статусе FORMED, а не только одобренные модератором",
+        )
+
+    def handle(self, *args, **options):
+        if options['include_unapproved']:
+            requests = CalculationRequest.objects.filter(status=CalculationRequest.CalculationRequestStatus.FORMED)
+        else:
+            requests = awaiting_results()
+        
+        processed = calculate_all(requests, options['batch_size'])
+        self.stdout.write(f"Processed {processed} requests")
@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from energycalc_apps.core import catalog_cache
+from energycalc_apps.core.device_transfer import FORMATS, detect_format, import_devices, iter_records
+
+class Command(BaseCommand):
+    help = "Импорт устройств из CSV или NDJSON файла с upsert по названию"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        file_format = detect_format(options['path'], options['format'])
+        if file_format is None:
+            raise CommandError("Cannot detect file format, use --format")
+        
+        with open(options['path'], 'rb') as stream:
+            report = import_devices(iter_records(stream, file_format), options['chunk_size'])
+        
+        if report["created"] or report["updated"]:
+            catalog_cache.bump_version()
+        
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
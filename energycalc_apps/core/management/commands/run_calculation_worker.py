@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from energycalc_apps.core import dispatch, outbox
+
+class Command(BaseCommand):
+    help = "Воркер outbox: отправляет одобренные заявки в сервис расчета"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.OUTBOX_WORKER_CONCURRENCY)
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=settings.OUTBOX_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Обработать одну пачку и завершиться")
+        parser.add_argument('--requeue-dead', action='store_true', help="Вернуть задания из dead-letter в очередь")
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f"Requeued {outbox.requeue_dead()} jobs")
+            return
+        
+        client = dispatch.DispatchClient(concurrency=options['concurrency'])
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            while True:
+                processed = outbox.process(executor, client, limit=options['batch_size'])
+                if options['once']:
+                    self.stdout.write(f"Processed {processed} jobs, dispatch: {client.stats()}")
+                    return
+                if not processed:
+                    time.sleep(options['poll_interval'])
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_alter_calculationrequest_result'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['name', 'id'], name='device_name_id_idx'),
+        ),
+    ]
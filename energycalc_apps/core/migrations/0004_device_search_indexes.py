@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:40
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_device_name_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='device',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='device_name_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['category', 'energy_class'], name='device_category_class_idx'),
+        ),
+    ]
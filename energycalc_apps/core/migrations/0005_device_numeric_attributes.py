@@ -0,0 +1,94 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:05
+
+import re
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Копия разбора из core/units.py на момент миграции: миграция не должна
+# зависеть от кода приложения, который может измениться позже
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+MINUTES_MARKERS = ('мин', 'min')
+
+
+def parse_number(value):
+    match = NUMBER_RE.search(value or '')
+    if match is None:
+        return None
+    return float(match.group().replace(',', '.'))
+
+
+def parse_hours(value):
+    number = parse_number(value)
+    if number is None:
+        return None
+    if any(marker in value.lower() for marker in MINUTES_MARKERS):
+        return number / 60
+    return number
+
+
+def backfill_numeric_attributes(apps, schema_editor):
+    Device = apps.get_model('core', 'Device')
+    last_id = 0
+    while True:
+        batch = list(
+            Device.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'voltage', 'work_per_day')[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for device in batch:
+            device.voltage_volts = parse_number(device.voltage)
+            device.hours_per_day = parse_hours(device.work_per_day)
+        Device.objects.bulk_update(batch, ['voltage_volts', 'hours_per_day'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_device_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='hours_per_day',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Работа в день (ч)'),
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='voltage_volts',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Напряжение (В)'),
+        ),
+        migrations.RunPython(backfill_numeric_attributes, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['power'], name='device_power_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['consumption'], name='device_consumption_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['peak_power'], name='device_peak_power_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['energy_class'], name='device_energy_class_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['voltage_volts'], name='device_voltage_volts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='device',
+            index=models.Index(fields=['hours_per_day'], name='device_hours_per_day_idx'),
+        ),
+    ]
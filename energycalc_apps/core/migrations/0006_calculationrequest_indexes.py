@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_device_numeric_attributes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='calculationrequest',
+            index=models.Index(fields=['client', 'status', 'creation_datetime'], name='calcrequest_client_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='calculationrequest',
+            index=models.Index(condition=models.Q(('status', 'DELETED'), _negated=True), fields=['creation_datetime'], name='calcrequest_active_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='calculationrequest',
+            index=models.Index(condition=models.Q(('status', 'DELETED'), _negated=True), fields=['client', 'creation_datetime'], name='calcrequest_client_active_idx'),
+        ),
+    ]
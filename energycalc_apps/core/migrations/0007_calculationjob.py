@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_calculationrequest_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalculationJob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('DONE', 'Done'), ('DEAD', 'Dead')], default='PENDING', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('creation_datetime', models.DateTimeField(auto_now_add=True)),
+                ('dispatch_datetime', models.DateTimeField(blank=True, null=True)),
+                ('calculation_request', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='core.calculationrequest')),
+            ],
+            options={
+                'db_table': 'CalculationJob',
+                'indexes': [models.Index(condition=models.Q(('status__in', ['PENDING', 'PROCESSING'])), fields=['next_attempt_at'], name='calcjob_active_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_drafts(apps, schema_editor):
+    """Оставляет у клиента самый ранний черновик, остальные помечает удаленными"""
+    CalculationRequest = apps.get_model('core', 'CalculationRequest')
+    duplicates = (
+        CalculationRequest.objects.filter(status='DRAFT')
+        .values('client_id')
+        .annotate(drafts=Count('id'), keep_id=Min('id'))
+        .filter(drafts__gt=1)
+    )
+    for row in duplicates:
+        CalculationRequest.objects.filter(client_id=row['client_id'], status='DRAFT').exclude(
+            id=row['keep_id']
+        ).update(status='DELETED')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_calculationjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_drafts, migrations.RunPython.noop, atomic=True),
+        # Частичный уникальный индекс строится без блокировки записи в таблицу
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY "calcrequest_one_draft_per_client" '
+                    'ON "CalculationRequest" ("client_id") WHERE "status" = \'DRAFT\'',
+                    'DROP INDEX CONCURRENTLY IF EXISTS "calcrequest_one_draft_per_client"',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='calculationrequest',
+                    constraint=models.UniqueConstraint(condition=models.Q(('status', 'DRAFT')), fields=('client',), name='calcrequest_one_draft_per_client'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_one_draft_per_client'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculationjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
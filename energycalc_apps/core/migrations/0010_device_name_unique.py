@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def rename_duplicate_devices(apps, schema_editor):
+    """Оставляет название у самого раннего устройства, к остальным добавляет их id"""
+    Device = apps.get_model('core', 'Device')
+    max_length = Device._meta.get_field('name').max_length
+    duplicates = (
+        Device.objects.values('name')
+        .annotate(devices=Count('id'), keep_id=Min('id'))
+        .filter(devices__gt=1)
+    )
+    for row in duplicates:
+        for device in Device.objects.filter(name=row['name']).exclude(id=row['keep_id']):
+            suffix = f" ({device.id})"
+            device.name = device.name[:max_length - len(suffix)] + suffix
+            device.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_calculationjob_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_devices, migrations.RunPython.noop, atomic=True),
+        # Индекс строится без блокировки записи, затем становится ограничением без повторной проверки
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY "device_name_unique" ON "device" ("name")',
+                    'DROP INDEX CONCURRENTLY IF EXISTS "device_name_unique"',
+                ),
+                migrations.RunSQL(
+                    'ALTER TABLE "device" ADD CONSTRAINT "device_name_unique" UNIQUE USING INDEX "device_name_unique"',
+                    'ALTER TABLE "device" DROP CONSTRAINT "device_name_unique"',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='device',
+                    constraint=models.UniqueConstraint(fields=('name',), name='device_name_unique'),
+                ),
+            ],
+        ),
+    ]
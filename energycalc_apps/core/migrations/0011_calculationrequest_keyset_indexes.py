@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_device_name_unique'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='calculationrequest',
+            index=models.Index(condition=models.Q(('status', 'DELETED'), _negated=True), fields=['creation_datetime', 'id'], name='calcrequest_active_keyset_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='calculationrequest',
+            index=models.Index(condition=models.Q(('status', 'DELETED'), _negated=True), fields=['client', 'creation_datetime', 'id'], name='calcrequest_client_keyset_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='calculationrequest',
+            name='calcrequest_active_created_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='calculationrequest',
+            name='calcrequest_client_active_idx',
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.contrib.auth.models import User
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
+from .units import parse_number, parse_hours
 
 class Device(models.Model):
     id = models.AutoField(primary_key=True, verbose_name='ID')
@@ -17,12 +21,39 @@ class Device(models.Model):
     work_per_day = models.CharField(max_length=50, verbose_name='Работа в день')
     energy_class = models.CharField(max_length=10, verbose_name='Энергетический класс')
 
+    # Числовые значения voltage и work_per_day для фильтрации по диапазонам
+    voltage_volts = models.FloatField(null=True, blank=True, editable=False, verbose_name='Напряжение (В)')
+    hours_per_day = models.FloatField(null=True, blank=True, editable=False, verbose_name='Работа в день (ч)')
+
     class Meta:
         db_table = 'device'
+        indexes = [
+            models.Index(fields=['name', 'id'], name='device_name_id_idx'),
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='device_name_trgm_idx'),
+            models.Index(fields=['category', 'energy_class'], name='device_category_class_idx'),
+            models.Index(fields=['power'], name='device_power_idx'),
+            models.Index(fields=['consumption'], name='device_consumption_idx'),
+            models.Index(fields=['peak_power'], name='device_peak_power_idx'),
+            models.Index(fields=['energy_class'], name='device_energy_class_idx'),
+            models.Index(fields=['voltage_volts'], name='device_voltage_volts_idx'),
+            models.Index(fields=['hours_per_day'], name='device_hours_per_day_idx'),
+        ]
+        constraints = [
+            # Импорт выполняет upsert по названию (ON CONFLICT (name))
+            models.UniqueConstraint(fields=['name'], name='device_name_unique'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def fill_numeric_attributes(self):
+        self.voltage_volts = parse_number(self.voltage)
+        self.hours_per_day = parse_hours(self.work_per_day)
+
+    def save(self, *args, **kwargs):
+        self.fill_numeric_attributes()
+        super().save(*args, **kwargs)
+
 class CalculationRequest(models.Model):
     id = models.AutoField(primary_key=True, verbose_name='ID')
     class CalculationRequestStatus(models.TextChoices):
@@ -55,6 +86,18 @@ class CalculationRequest(models.Model):
     
     class Meta:
         db_table = 'CalculationRequest'
+        indexes = [
+            models.Index(fields=['client', 'status', 'creation_datetime'], name='calcrequest_client_status_idx'),
+            models.Index(fields=['creation_datetime', 'id'], condition=~models.Q(status='DELETED'),
+                         name='calcrequest_active_keyset_idx'),
+            models.Index(fields=['client', 'creation_datetime', 'id'], condition=~models.Q(status='DELETED'),
+                         name='calcrequest_client_keyset_idx'),
+        ]
+        constraints = [
+            # У клиента может быть только одна заявка-черновик (корзина)
+            models.UniqueConstraint(fields=['client'], condition=models.Q(status='DRAFT'),
+                                    name='calcrequest_one_draft_per_client'),
+        ]
 
     def __str__(self):
         return f"Расчет № {self.id}"
@@ -71,6 +114,41 @@ class DeviceInRequest(models.Model):
     def __str__(self):
         return f"{self.calculation_request.id}-{self.device.id}"
 
+class CalculationJob(models.Model):
+    """Задание outbox на отправку заявки в сервис расчета"""
+    id = models.AutoField(primary_key=True, verbose_name='ID')
+    class CalculationJobStatus(models.TextChoices):
+        PENDING = "PENDING"
+        PROCESSING = "PROCESSING"
+        DONE = "DONE"
+        DEAD = "DEAD"
+
+    calculation_request = models.ForeignKey(CalculationRequest, on_delete=models.DO_NOTHING)
+    payload = models.JSONField()
+    # Отпечаток набора устройств и параметров для кеша результатов
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(
+        max_length=10,
+        choices=CalculationJobStatus.choices,
+        default=CalculationJobStatus.PENDING,
+    )
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    creation_datetime = models.DateTimeField(auto_now_add=True)
+    dispatch_datetime = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'CalculationJob'
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status__in=['PENDING', 'PROCESSING']),
+                         name='calcjob_active_idx'),
+        ]
+
+    def __str__(self):
+        return f"Задание {self.id} для расчета № {self.calculation_request_id}"
+
 class MyUser(AbstractUser):
     is_moderator = models.BooleanField(default=False)
     
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox
+from .models import CalculationRequest
+
+RequestStatus = CalculationRequest.CalculationRequestStatus
+
+ACTIONS = ('complete', 'reject')
+
+def moderate_requests(request_ids, action, moderator):
+    """
+    Пакетное одобрение/отклонение заявок модератором.
+    
+    Все заявки блокируются и проверяются одним запросом, статус, модератор
+    и время завершения выставляются одним UPDATE. Одобренные заявки остаются
+    в статусе FORMED до получения результата, задания на расчет для них
+    создаются одной пачкой в той же транзакции (кроме найденных в кеше
+    результатов - они завершаются сразу).
+    Возвращает (число измененных заявок, исходы по каждому id).
+    """
+    outcomes = []
+    seen = set()
+    for request_id in request_ids:
+        if not isinstance(request_id, int) or isinstance(request_id, bool):
+            outcomes.append({"request_id": request_id, "outcome": "invalid"})
+        elif request_id in seen:
+            outcomes.append({"request_id": request_id, "outcome": "duplicate"})
+        else:
+            seen.add(request_id)
+            outcomes.append({"request_id": request_id, "outcome": None})
+    
+    with transaction.atomic():
+        current = {
+            row[0]: row[1:]
+            for row in CalculationRequest.objects.select_for_update().filter(id__in=list(seen))
+            .values_list('id', 'status', 'moderator_id', 'residents', 'temperature')
+        }
+        
+        eligible = []
+        outcomes_by_id = {}
+        for outcome in outcomes:
+            if outcome["outcome"] is not None:
+                continue
+            request_id = outcome["request_id"]
+            if request_id not in current:
+                outcome["outcome"] = "not_found"
+                continue
+            request_status, moderator_id, residents, temperature = current[request_id]
+            if request_status != RequestStatus.FORMED:
+                outcome["outcome"] = "invalid_status"
+            elif moderator_id is not None:
+                # Уже одобрена и ждет результата: повторно в очередь не ставим и не
+                # отклоняем, иначе пришедший результат перезапишет REJECTED
+                outcome["outcome"] = "already_approved"
+            else:
+                outcome["outcome"] = "approved" if action == 'complete' else "rejected"
+                outcomes_by_id[request_id] = outcome
+                eligible.append((request_id, residents, temperature))
+        
+        if eligible:
+            fields = {"moderator": moderator, "completion_datetime": timezone.now()}
+            if action == 'reject':
+                fields["status"] = RequestStatus.REJECTED
+            CalculationRequest.objects.filter(id__in=[row[0] for row in eligible]).update(**fields)
+            if action == 'complete':
+                # Заявки с результатом из кеша завершаются сразу
+                for request_id in outbox.enqueue_many(eligible):
+                    outcomes_by_id[request_id]["outcome"] = "completed"
+    return len(eligible), outcomes
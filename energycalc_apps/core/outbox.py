@@ -0,0 +1,200 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from . import dispatch, result_cache
+from .calculation import build_service_payloads
+from .models import CalculationJob, CalculationRequest
+
+JobStatus = CalculationJob.CalculationJobStatus
+
+def enqueue(calculation_request):
+    """
+    Ставит заявку в очередь на расчет.
+    
+    Вызывается в той же транзакции, что и смена статуса заявки: задание
+    появится в очереди только вместе с одобрением. Если результат для того
+    же набора устройств и параметров есть в кеше результатов, заявка сразу
+    завершается (поля экземпляра обновляются) и задание не создается.
+    """
+    completed = enqueue_many(
+        [(calculation_request.id, calculation_request.residents, calculation_request.temperature)]
+    )
+    if calculation_request.id in completed:
+        calculation_request.result = completed[calculation_request.id]
+        calculation_request.status = CalculationRequest.CalculationRequestStatus.COMPLETED
+
+def enqueue_many(requests):
+    """
+    Ставит в очередь несколько заявок: payload строится одним запросом
+    на всю пачку, задания создаются одним bulk_create.
+    
+    requests - последовательность (id, residents, temperature). Заявки,
+    найденные в кеше результатов по отпечатку, завершаются одним
+    bulk_update без отправки в сервис. Возвращает {id заявки: результат}
+    для завершенных из кеша.
+    """
+    payloads = build_service_payloads(requests)
+    fingerprints = {request_id: result_cache.fingerprint(payload) for request_id, payload in payloads.items()}
+    cached = result_cache.lookup_many(list(fingerprints.values()))
+    completed = {
+        request_id: cached[fingerprint]
+        for request_id, fingerprint in fingerprints.items()
+        if fingerprint in cached
+    }
+    
+    if completed:
+        CalculationRequest.objects.bulk_update(
+            [
+                CalculationRequest(id=request_id, result=result,
+                                   status=CalculationRequest.CalculationRequestStatus.COMPLETED)
+                for request_id, result in completed.items()
+            ],
+            ['result', 'status'],
+        )
+    CalculationJob.objects.bulk_create([
+        CalculationJob(calculation_request_id=request_id, payload=payload, fingerprint=fingerprints[request_id])
+        for request_id, payload in payloads.items()
+        if request_id not in completed
+    ])
+    return completed
+
+def claim(limit):
+    """
+    Забирает до limit готовых к отправке заданий.
+    
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько воркеров не получат одно и то же задание. Задания в статусе
+    PROCESSING с истекшей арендой (воркер упал) забираются повторно.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            CalculationJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.PENDING, next_attempt_at__lte=now)
+                | Q(status=JobStatus.PROCESSING, locked_until__lt=now)
+            )
+            .order_by('next_attempt_at')[:limit]
+        )
+        if not jobs:
+            return []
+        
+        locked_until = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        CalculationJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=JobStatus.PROCESSING,
+            locked_until=locked_until,
+            attempts=F('attempts') + 1,
+        )
+    for job in jobs:
+        job.status = JobStatus.PROCESSING
+        job.locked_until = locked_until
+        job.attempts += 1
+    return jobs
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повтором с разбросом до 10%"""
+    delay = min(settings.OUTBOX_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX_DELAY)
+    return delay * random.uniform(1, 1.1)
+
+def mark_done(jobs):
+    CalculationJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=JobStatus.DONE,
+        locked_until=None,
+        dispatch_datetime=timezone.now(),
+    )
+
+def mark_failed(job, error):
+    """Планирует повтор задания или переводит его в dead-letter после OUTBOX_MAX_ATTEMPTS попыток"""
+    job.last_error = str(error)[:2000]
+    job.locked_until = None
+    if job.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        job.status = JobStatus.DEAD
+    else:
+        job.status = JobStatus.PENDING
+        job.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+    job.save(update_fields=['status', 'locked_until', 'last_error', 'next_attempt_at'])
+
+def release(jobs):
+    """Возвращает задания в очередь без учета попытки (сервис недоступен)"""
+    CalculationJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=JobStatus.PENDING,
+        locked_until=None,
+        attempts=F('attempts') - 1,
+        next_attempt_at=timezone.now() + timedelta(seconds=settings.CALCULATION_SERVICE_RESET_TIMEOUT),
+    )
+
+def process(executor, client=None, limit=None, window=None):
+    """
+    Один цикл воркера: забирает пачку заданий и отправляет их через пул executor.
+    
+    Если пачка неполная, воркер ждет window секунд и добирает задания, чтобы
+    одобрения, сделанные почти одновременно, ушли одним вызовом. Задания
+    делятся на пачки по client.batch_size, каждая пачка - один HTTP-вызов.
+    Исходы записываются в БД по каждому заданию из вызывающего потока. Возвращает число
+    обработанных заданий.
+    """
+    client = client or dispatch.get_client()
+    limit = limit or settings.OUTBOX_BATCH_SIZE
+    window = settings.OUTBOX_COALESCE_WINDOW if window is None else window
+    if not client.is_available():
+        return 0
+    
+    jobs = claim(limit)
+    if jobs and len(jobs) < limit and window:
+        time.sleep(window)
+        jobs += claim(limit - len(jobs))
+    batches = [jobs[i:i + client.batch_size] for i in range(0, len(jobs), client.batch_size)]
+    
+    def send(batch):
+        try:
+            return client.send([job.payload for job in batch])
+        except Exception as e:
+            return [e] * len(batch)
+    
+    done = []
+    released = []
+    for batch, outcomes in zip(batches, executor.map(send, batches)):
+        for job, error in zip(batch, outcomes):
+            if error is None:
+                done.append(job)
+            elif isinstance(error, dispatch.CircuitOpenError):
+                released.append(job)
+            else:
+                print(f"Error dispatching calculation job {job.id}: {error}")
+                mark_failed(job, error)
+    mark_done(done)
+    release(released)
+    return len(jobs)
+
+def requeue_dead(job_ids=None):
+    """Возвращает задания из dead-letter в очередь"""
+    jobs = CalculationJob.objects.filter(status=JobStatus.DEAD)
+    if job_ids is not None:
+        jobs = jobs.filter(id__in=job_ids)
+    return jobs.update(status=JobStatus.PENDING, attempts=0, next_attempt_at=timezone.now())
+
+def stats():
+    """Глубина очереди по статусам, возраст самого старого задания и задержка отправки за последний час"""
+    now = timezone.now()
+    depth = dict(
+        CalculationJob.objects.filter(status__in=[JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.DEAD])
+        .values_list('status')
+        .annotate(count=Count('id'))
+    )
+    oldest = CalculationJob.objects.filter(status=JobStatus.PENDING).aggregate(oldest=Min('creation_datetime'))['oldest']
+    latency = CalculationJob.objects.filter(
+        status=JobStatus.DONE, dispatch_datetime__gte=now - timedelta(hours=1)
+    ).aggregate(latency=Avg(F('dispatch_datetime') - F('creation_datetime')))['latency']
+    return {
+        "pending": depth.get(JobStatus.PENDING, 0),
+        "processing": depth.get(JobStatus.PROCESSING, 0),
+        "dead": depth.get(JobStatus.DEAD, 0),
+        "oldest_pending_seconds": (now - oldest).total_seconds() if oldest else None,
+        "dispatch_latency_seconds": latency.total_seconds() if latency else None,
+    }
@@ -0,0 +1,154 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+from .search import is_ranked
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor-пагинация по всем полям ordering.
+
+    Стандартный CursorPagination хранит в курсоре только значение первого поля
+    сортировки и смещение среди строк с тем же значением. Здесь курсор хранит
+    значения всех полей; последнее поле ordering должно быть уникальным (id),
+    поэтому позиция однозначна и следующая страница выбирается условием
+    (a, b) > (x, y) без смещения.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._position_filter(self._decode_position(current_position, queryset), reverse)
+            )
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        has_following_position = len(results) > len(self.page)
+        has_preceding_position = (current_position is not None) or (offset > 0)
+
+        # Границы ссылок - крайние строки страницы в порядке запроса:
+        # последняя для продолжения в том же направлении, первая - для обратного
+        if self.page:
+            following_position = self._get_position_from_instance(self.page[-1], self.ordering)
+            preceding_position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            following_position = preceding_position = current_position
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = has_preceding_position
+            self.has_previous = has_following_position
+            self.next_position = preceding_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = has_preceding_position
+            self.next_position = following_position
+            self.previous_position = preceding_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        # Позиция однозначна, смещение не нужно
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.previous_position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            values.append(str(instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)))
+        return json.dumps(values)
+
+    def _decode_position(self, position, queryset):
+        """Значения полей ordering из курсора, приведенные к типам полей"""
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering) or None in values:
+                raise ValueError(position)
+            return [
+                self._ordering_field(queryset, order.lstrip('-')).to_python(value)
+                for order, value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _ordering_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def _position_filter(self, values, reverse):
+        """(a, b) > (x, y) в виде a > x OR (a = x AND b > y) с учетом направлений сортировки"""
+        conditions = []
+        for index, order in enumerate(self.ordering):
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            equal = {self.ordering[i].lstrip('-'): values[i] for i in range(index)}
+            conditions.append(Q(**equal, **{f"{order.lstrip('-')}__{lookup}": values[index]}))
+        # Нестрогая граница по первому полю позволяет планировщику сканировать индекс как диапазон
+        first = self.ordering[0]
+        bound = 'lte' if reverse != first.startswith('-') else 'gte'
+        return Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & reduce(or_, conditions)
+
+class DeviceCursorPagination(KeysetCursorPagination):
+    """
+    Keyset-пагинация каталога устройств по (name, id).
+
+    Курсор непрозрачен для клиента, стоимость любой страницы одинакова
+    благодаря индексу device_name_id_idx. Результаты поиска по названию
+    упорядочиваются по релевантности (rank, id).
+    """
+    page_size = settings.DEVICES_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.DEVICES_MAX_PAGE_SIZE
+    ordering = ('name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        if is_ranked(queryset):
+            return ('-rank', 'id')
+        return super().get_ordering(request, queryset, view)
+
+class CalculationRequestCursorPagination(KeysetCursorPagination):
+    """
+    Keyset-пагинация списка заявок от новых к старым по (creation_datetime, id).
+
+    Обслуживается частичными индексами calcrequest_active_keyset_idx и
+    calcrequest_client_keyset_idx.
+    """
+    page_size = settings.REQUESTS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.REQUESTS_MAX_PAGE_SIZE
+    ordering = ('-creation_datetime', '-id')
@@ -1,14 +1,19 @@
 from rest_framework import permissions
-from .utils import identity_user
+
+def _authenticated_user(request):
+    user = request.user
+    if user is None or not user.is_authenticated:
+        return None
+    return user
 
 class IsModerator(permissions.BasePermission):
     def has_permission(self, request, view):
-        user = identity_user(request)
+        user = _authenticated_user(request)
         return bool(user and user.is_moderator)
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = identity_user(request)
+        user = _authenticated_user(request)
         
         if request.method in permissions.SAFE_METHODS:
             return True
@@ -16,10 +21,10 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        user = identity_user(request)
+        user = _authenticated_user(request)
         return user and obj.client == user
 
 class IsGuest(permissions.BasePermission):
     def has_permission(self, request, view):
-        user = identity_user(request)
-        return user is None
\ No newline at end of file
+        user = _authenticated_user(request)
+        return user is None
@@ -1,4 +1,23 @@
 import redis
 from django.conf import settings
 
-session_storage = redis.StrictRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
\ No newline at end of file
+connection_pool = redis.BlockingConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=30,
+)
+
+session_storage = redis.StrictRedis(connection_pool=connection_pool)
+
+def select_database(db):
+    """Переключает соединения пула на другую базу Redis (открытые соединения закрываются)"""
+    connection_pool.connection_kwargs['db'] = db
+    connection_pool.disconnect()
+
+def current_database():
+    return connection_pool.connection_kwargs.get('db', 0)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CalculationJob
+from .redis import session_storage
+
+ENTRY_PREFIX = 'results:entry:'
+DEVICE_PREFIX = 'results:device:'
+LRU_KEY = 'results:lru'
+STATS_KEY = 'results:stats'
+
+def fingerprint(payload):
+    """
+    Канонический отпечаток заявки по данным для сервиса расчета:
+    отсортированные (id устройства, потребление, количество) и параметры residents/temperature.
+    """
+    devices = sorted(
+        (line["device"]["id"], float(line["device"]["consumption"]), line["quantity"])
+        for line in payload["devices"]
+    )
+    canonical = json.dumps(
+        [payload["residents"], payload["temperature"], devices],
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def lookup_many(fingerprints):
+    """
+    Возвращает {отпечаток: результат} для найденных в кеше. Отпечатки могут
+    повторяться: попадания и промахи считаются по каждому элементу.
+    
+    Найденные записи поднимаются в LRU, счетчики попаданий/промахов
+    общие для всех процессов и хранятся в Redis.
+    """
+    if not settings.RESULT_CACHE_ENABLED or not fingerprints:
+        return {}
+    try:
+        values = session_storage.mget([ENTRY_PREFIX + value for value in fingerprints])
+        found = {value: int(result) for value, result in zip(fingerprints, values) if result is not None}
+        hits = sum(result is not None for result in values)
+        
+        pipe = session_storage.pipeline()
+        if found:
+            now = time.time()
+            pipe.zadd(LRU_KEY, {value: now for value in found}, xx=True)
+            pipe.hincrby(STATS_KEY, 'hits', hits)
+        if hits < len(fingerprints):
+            pipe.hincrby(STATS_KEY, 'misses', len(fingerprints) - hits)
+        pipe.execute()
+        return found
+    except Exception as e:
+        print(f"Error reading result cache: {e}")
+        return {}
+
+def lookup(value):
+    return lookup_many([value]).get(value)
+
+def store_many(entries):
+    """
+    Сохраняет результаты: entries - список (отпечаток, id устройств, результат).
+    
+    Каждый отпечаток добавляется в индексы своих устройств для инвалидации.
+    Если записей больше RESULT_CACHE_MAX_ENTRIES, вытесняются давно не
+    использованные.
+    """
+    if not settings.RESULT_CACHE_ENABLED or not entries:
+        return
+    try:
+        now = time.time()
+        pipe = session_storage.pipeline()
+        for value, device_ids, result in entries:
+            pipe.set(ENTRY_PREFIX + value, result)
+            pipe.zadd(LRU_KEY, {value: now})
+            for device_id in device_ids:
+                pipe.sadd(f"{DEVICE_PREFIX}{device_id}", value)
+        pipe.zcard(LRU_KEY)
+        size = pipe.execute()[-1]
+        
+        overflow = size - settings.RESULT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [value for value, _ in session_storage.zpopmin(LRU_KEY, overflow)]
+            _delete_entries(evicted)
+            session_storage.hincrby(STATS_KEY, 'evictions', len(evicted))
+    except Exception as e:
+        print(f"Error storing result cache entries: {e}")
+
+def remember_results(results):
+    """
+    Кеширует результаты, пришедшие от сервиса расчета, после фиксации транзакции.
+    
+    results - {id заявки: результат}. Отпечатки берутся из заданий outbox
+    одним запросом.
+    """
+    if not settings.RESULT_CACHE_ENABLED or not results:
+        return
+    jobs = CalculationJob.objects.filter(
+        calculation_request_id__in=list(results)
+    ).exclude(fingerprint='').values_list('calculation_request_id', 'fingerprint', 'payload')
+    entries = {
+        value: ([line["device"]["id"] for line in payload["devices"]], results[request_id])
+        for request_id, value, payload in jobs
+    }
+    if entries:
+        transaction.on_commit(lambda: store_many(
+            [(value, device_ids, result) for value, (device_ids, result) in entries.items()]
+        ))
+
+def invalidate_devices(device_ids):
+    """Удаляет закешированные результаты всех заявок с этими устройствами (изменилось потребление)"""
+    if not settings.RESULT_CACHE_ENABLED or not device_ids:
+        return
+    try:
+        keys = [f"{DEVICE_PREFIX}{device_id}" for device_id in device_ids]
+        pipe = session_storage.pipeline()
+        pipe.sunion(keys)
+        pipe.delete(*keys)
+        stale = list(pipe.execute()[0])
+        if stale:
+            session_storage.zrem(LRU_KEY, *stale)
+            _delete_entries(stale)
+            session_storage.hincrby(STATS_KEY, 'invalidations', len(stale))
+    except Exception as e:
+        print(f"Error invalidating result cache: {e}")
+
+def _delete_entries(fingerprints):
+    # Ссылки из индексов устройств на удаленные записи остаются и безвредны:
+    # lookup по ним промахивается, а индексы очищаются при инвалидации устройства
+    if fingerprints:
+        session_storage.delete(*[ENTRY_PREFIX + (value.decode() if isinstance(value, bytes) else value)
+                                 for value in fingerprints])
+
+def stats():
+    try:
+        counters = {key.decode(): int(value) for key, value in session_storage.hgetall(STATS_KEY).items()}
+        entries = session_storage.zcard(LRU_KEY)
+    except Exception as e:
+        print(f"Error reading result cache stats: {e}")
+        return {}
+    hits = counters.get('hits', 0)
+    lookups = hits + counters.get('misses', 0)
+    return {
+        "entries": entries,
+        "hits": hits,
+        "misses": counters.get('misses', 0),
+        "hit_ratio": hits / lookups if lookups else 0.0,
+        "evictions": counters.get('evictions', 0),
+        "invalidations": counters.get('invalidations', 0),
+    }
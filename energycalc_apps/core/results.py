@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db import transaction
+
+from . import result_cache
+from .models import CalculationRequest
+
+RequestStatus = CalculationRequest.CalculationRequestStatus
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def ingest_results(entries):
+    """
+    Применяет пачку результатов от сервиса расчета.
+    
+    entries - список {"request_id", "result"}. Состояния всех заявок
+    проверяются одним запросом с блокировкой строк, результаты записываются
+    одним bulk_update. Повторная доставка того же результата не меняет
+    заявку и возвращает "already_completed", поэтому вызов идемпотентен.
+    Возвращает (число завершенных заявок, исходы по каждой записи).
+    """
+    outcomes = []
+    values = {}
+    for index, entry in enumerate(entries):
+        request_id = entry.get('request_id') if isinstance(entry, dict) else None
+        result = entry.get('result') if isinstance(entry, dict) else None
+        if not _is_int(request_id) or not _is_int(result):
+            outcomes.append({"index": index, "outcome": "invalid",
+                             "error": "request_id and result must be integers"})
+            continue
+        if request_id in values:
+            outcomes.append({"request_id": request_id, "outcome": "duplicate"})
+            continue
+        values[request_id] = result
+        outcomes.append({"request_id": request_id, "outcome": None})
+    
+    completed = []
+    with transaction.atomic():
+        current = {
+            request_id: (request_status, result)
+            for request_id, request_status, result in CalculationRequest.objects.select_for_update()
+            .filter(id__in=list(values)).values_list('id', 'status', 'result')
+        }
+        for outcome in outcomes:
+            if outcome.get("outcome") is not None:
+                continue
+            request_id = outcome["request_id"]
+            if request_id not in current:
+                outcome["outcome"] = "not_found"
+                continue
+            request_status, result = current[request_id]
+            if request_status == RequestStatus.FORMED:
+                outcome["outcome"] = "completed"
+                completed.append(CalculationRequest(id=request_id, result=values[request_id],
+                                                    status=RequestStatus.COMPLETED))
+            elif request_status == RequestStatus.COMPLETED and result == values[request_id]:
+                outcome["outcome"] = "already_completed"
+            elif request_status == RequestStatus.COMPLETED:
+                outcome["outcome"] = "conflict"
+            else:
+                outcome["outcome"] = "invalid_status"
+        
+        CalculationRequest.objects.bulk_update(
+            completed, ['result', 'status'], batch_size=settings.CALCULATION_ENGINE_UPDATE_BATCH_SIZE
+        )
+        result_cache.remember_results({request.id: request.result for request in completed})
+    return len(completed), outcomes
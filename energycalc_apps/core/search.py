@@ -0,0 +1,80 @@
+import math
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+# Параметр запроса -> (lookup, тип значения); каждый обслуживается B-tree индексом
+RANGE_FILTERS = {
+    'power_min': ('power__gte', int),
+    'power_max': ('power__lte', int),
+    'consumption_min': ('consumption__gte', float),
+    'consumption_max': ('consumption__lte', float),
+    'peak_power_min': ('peak_power__gte', int),
+    'peak_power_max': ('peak_power__lte', int),
+    'voltage_min': ('voltage_volts__gte', float),
+    'voltage_max': ('voltage_volts__lte', float),
+    'work_per_day_min': ('hours_per_day__gte', float),
+    'work_per_day_max': ('hours_per_day__lte', float),
+}
+
+# Диапазон integer в PostgreSQL: значение за его пределами приводит к ошибке БД
+INTEGER_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+def parse_range_filters(params):
+    """
+    Преобразует параметры запроса в lookups для QuerySet.filter().
+    
+    Для нечисловых значений, nan/inf и целых вне диапазона integer выбрасывает ValueError.
+    """
+    lookups = {}
+    for param, (lookup, value_type) in RANGE_FILTERS.items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            number = value_type(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for {param}: {value}")
+        if value_type is int and not INTEGER_RANGE[0] <= number <= INTEGER_RANGE[1]:
+            raise ValueError(f"Value out of range for {param}: {value}")
+        if value_type is float and not math.isfinite(number):
+            raise ValueError(f"Invalid value for {param}: {value}")
+        lookups[lookup] = number
+    
+    energy_classes = [c.strip() for c in params.get('energy_class__in', '').split(',') if c.strip()]
+    if energy_classes:
+        lookups['energy_class__in'] = energy_classes
+    return lookups
+
+def filter_devices(devices, name='', category='', energy_class='', ranges=None):
+    """
+    Фильтрация каталога устройств.
+
+    Поиск по названию обслуживается GIN-индексом pg_trgm по UPPER(name)
+    (device_name_trgm_idx), результаты ранжируются по сходству с запросом.
+    Фильтры по категории и классу энергопотребления используют индекс
+    device_category_class_idx, фильтры по диапазонам (parse_range_filters) -
+    индексы числовых колонок.
+    """
+    if category:
+        devices = devices.filter(category=category)
+    
+    if energy_class:
+        devices = devices.filter(energy_class=energy_class)
+    
+    if ranges:
+        devices = devices.filter(**ranges)
+    
+    if name:
+        # word_similarity возвращает real: без приведения к double precision
+        # значение в курсоре ("0.8") не равно сохраненному 0.800000011920929,
+        # и строки с таким же rank на границе страницы теряются
+        devices = devices.filter(name__icontains=name).annotate(
+            rank=Cast(TrigramWordSimilarity(name, 'name'), FloatField())
+        )
+    
+    return devices
+
+def is_ranked(devices):
+    return 'rank' in devices.query.annotations
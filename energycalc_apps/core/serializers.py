@@ -1,17 +1,21 @@
 from rest_framework import serializers
+from django.db.models import Count, Prefetch
 from .models import Device, CalculationRequest, DeviceInRequest, MyUser
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth import authenticate
-from .utils import get_minio_url
+from .utils import get_minio_url, get_minio_url_prefix
+from . import hashing
+from .search import INTEGER_RANGE
 from django.conf import settings
 
+DEVICE_FIELDS = ('id', 'name', 'category', 'image_url', 'power', 'consumption',
+                 'peak_power', 'voltage', 'work_per_day', 'energy_class')
+
 class DeviceSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Device
-        fields = ['id', 'name', 'category', 'image_url', 'power', 'consumption', 
-                  'peak_power', 'voltage', 'work_per_day', 'energy_class']
+        fields = list(DEVICE_FIELDS)
     
     def get_image_url(self, obj):
         """
@@ -27,6 +31,31 @@ class DeviceSerializer(serializers.ModelSerializer):
         
         return get_minio_url(image_name)
 
+def serialize_devices(rows, fields=DEVICE_FIELDS):
+    """
+    Быстрая сериализация списка устройств только для чтения.
+    
+    Принимает словари из Device.objects.values(*fields) и возвращает
+    те же данные, что DeviceSerializer(many=True), без накладных расходов полей DRF.
+    """
+    image_prefix = get_minio_url_prefix()
+    with_image = 'image_url' in fields
+    data = []
+    for row in rows:
+        item = {field: row[field] for field in fields}
+        if with_image:
+            image_url = item['image_url']
+            if image_url:
+                if image_url.startswith(('http://', 'https://')):
+                    image_url = image_url.split('/')[-1]
+                if image_url.startswith('images/'):
+                    image_url = image_url[len('images/'):]
+                item['image_url'] = image_prefix + image_url
+            else:
+                item['image_url'] = None
+        data.append(item)
+    return data
+
 class DeviceInRequestSerializer(serializers.ModelSerializer):
     device = DeviceSerializer(read_only=True)
     
@@ -46,7 +75,48 @@ class CalculationRequestSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "status", "creation_datetime", "formation_datetime", 
                            "completion_datetime", "client_username", "moderator_username"]
 
-class CalculationRequestListSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Позволяет ограничить набор полей сериализатора аргументом fields.
+    
+    source_columns задает колонки модели для полей, которые не совпадают
+    с полем модели по имени (пустой кортеж - поле не читается из строки).
+    field_annotations и field_prefetches - аннотации и Prefetch, которые
+    добавляются в выборку только для запрошенных полей, чтобы сериализация
+    не выполняла запросов на каждую строку. Список допустимых полей - Meta.fields.
+    """
+    source_columns = {}
+    field_annotations = {}
+    field_prefetches = {}
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+    
+    @classmethod
+    def restrict_queryset(cls, queryset, fields, extra_columns=()):
+        """Ограничивает выборку колонками, необходимыми для сериализации fields"""
+        columns = {'id', *extra_columns}
+        for field_name in fields:
+            columns.update(cls.source_columns.get(field_name, (field_name,)))
+        
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        queryset = queryset.only(*sorted(columns))
+        
+        annotations = {name: cls.field_annotations[name]() for name in fields if name in cls.field_annotations}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        
+        prefetches = [cls.field_prefetches[name]() for name in fields if name in cls.field_prefetches]
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+class CalculationRequestListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     client_username = serializers.CharField(source='client.username', read_only=True)
     devices_count = serializers.SerializerMethodField()
 
@@ -55,10 +125,20 @@ class CalculationRequestListSerializer(serializers.ModelSerializer):
         fields = ["id", "status", "residents", "temperature", "result", 
                   "creation_datetime", "formation_datetime", "client_username", "devices_count"]
 
+    source_columns = {
+        "client_username": ("client__username",),
+        "devices_count": (),
+    }
+    field_annotations = {
+        "devices_count": lambda: Count('deviceinrequest'),
+    }
+
     def get_devices_count(self, obj):
+        if hasattr(obj, 'devices_count'):
+            return obj.devices_count
         return DeviceInRequest.objects.filter(calculation_request=obj).count()
 
-class CalculationRequestDetailSerializer(serializers.ModelSerializer):
+class CalculationRequestDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     client_username = serializers.CharField(source='client.username', read_only=True)
     moderator_username = serializers.CharField(source='moderator.username', read_only=True, allow_null=True)
     devices = serializers.SerializerMethodField()
@@ -69,16 +149,53 @@ class CalculationRequestDetailSerializer(serializers.ModelSerializer):
                   "creation_datetime", "formation_datetime", "completion_datetime", 
                   "client_username", "moderator_username", "devices"]
 
+    source_columns = {
+        "client_username": ("client__username",),
+        "moderator_username": ("moderator__username",),
+        "devices": (),
+    }
+    field_prefetches = {
+        "devices": lambda: Prefetch(
+            'deviceinrequest_set',
+            queryset=DeviceInRequest.objects.select_related('device'),
+            to_attr='device_lines',
+        ),
+    }
+
     def get_devices(self, obj):
-        devices_in_request = DeviceInRequest.objects.filter(calculation_request=obj)
+        devices_in_request = getattr(obj, 'device_lines', None)
+        if devices_in_request is None:
+            devices_in_request = DeviceInRequest.objects.filter(calculation_request=obj).select_related('device')
         return DeviceInRequestSerializer(devices_in_request, many=True).data
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        if representation.get('result') == 0:
+        if 'result' in representation and representation['result'] == 0:
             representation['result'] = None
         return representation
 
+# Значения за пределами integer в PostgreSQL приводят к ошибке БД
+class CartItemSerializer(serializers.Serializer):
+    device_id = serializers.IntegerField(min_value=1, max_value=INTEGER_RANGE[1])
+    quantity = serializers.IntegerField(min_value=1, max_value=INTEGER_RANGE[1])
+
+class CartUpdateSerializer(serializers.Serializer):
+    """Пакетное изменение корзины: установка количества и удаление устройств"""
+    items = CartItemSerializer(many=True, required=False, default=list)
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=INTEGER_RANGE[1]), required=False, default=list
+    )
+
+    def validate(self, data):
+        device_ids = [item['device_id'] for item in data['items']]
+        if len(device_ids) != len(set(device_ids)):
+            raise serializers.ValidationError("Duplicate device_id in items")
+        if set(device_ids) & set(data['remove']):
+            raise serializers.ValidationError("Device cannot be both updated and removed")
+        if len(device_ids) + len(data['remove']) > settings.CART_MAX_BATCH:
+            raise serializers.ValidationError(f"At most {settings.CART_MAX_BATCH} changes per call")
+        return data
+
 class MyUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = MyUser
@@ -93,7 +210,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         fields = ["username", "password", "first_name", "last_name", "email"]
     
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])
+        validated_data['password'] = hashing.make_password(validated_data['password'])
         return super().create(validated_data)
 
 class UserLoginSerializer(serializers.Serializer):
@@ -0,0 +1,122 @@
+import time
+import uuid
+
+from django.conf import settings
+
+from .redis import session_storage
+from . import identity_cache
+
+INDEX_PREFIX = 'user_sessions:'
+
+def create(user_id):
+    """
+    Создает сессию пользователя с TTL и добавляет ее в индекс сессий пользователя.
+
+    Индекс - sorted set, где score равен времени последнего продления сессии,
+    поэтому устаревшие записи и самые старые сессии удаляются без SCAN.
+    """
+    session = str(uuid.uuid4())
+    ttl = settings.SESSION_TTL
+    now = time.time()
+    index = _index_key(user_id)
+    
+    pipe = session_storage.pipeline()
+    pipe.set(session, user_id, ex=ttl)
+    pipe.zadd(index, {session: now})
+    pipe.zremrangebyscore(index, '-inf', now - ttl)
+    pipe.expire(index, ttl)
+    pipe.zcard(index)
+    sessions_count = pipe.execute()[-1]
+    
+    max_sessions = settings.SESSION_MAX_PER_USER
+    if max_sessions and sessions_count > max_sessions:
+        oldest = session_storage.zrange(index, 0, sessions_count - max_sessions - 1)
+        _delete_sessions(index, [s.decode('utf-8') for s in oldest])
+    
+    return session
+
+def lookup(session):
+    """
+    Возвращает id пользователя сессии или None за один запрос к Redis.
+
+    Если с момента последнего продления прошло больше SESSION_RENEW_INTERVAL,
+    сессия продлевается на SESSION_TTL (сессии без TTL тоже получают его).
+    """
+    if not _is_session_id(session):
+        return None
+    
+    pipe = session_storage.pipeline(transaction=False)
+    pipe.get(session)
+    pipe.ttl(session)
+    user_id, ttl = pipe.execute()
+    
+    if user_id is None:
+        return None
+    try:
+        user_id = int(user_id)
+    except (ValueError, TypeError):
+        return None
+    
+    if ttl < settings.SESSION_TTL - settings.SESSION_RENEW_INTERVAL:
+        _renew(session, user_id)
+    return user_id
+
+def delete(session):
+    if not _is_session_id(session):
+        return
+    
+    pipe = session_storage.pipeline()
+    pipe.get(session)
+    pipe.delete(session)
+    user_id, _ = pipe.execute()
+    
+    if user_id is not None:
+        session_storage.zrem(_index_key(int(user_id)), session)
+    identity_cache.invalidate_session(session)
+
+def delete_all(user_id):
+    """Завершает все сессии пользователя ("выйти на всех устройствах")"""
+    index = _index_key(user_id)
+    sessions = [s.decode('utf-8') for s in session_storage.zrange(index, 0, -1)]
+    
+    pipe = session_storage.pipeline()
+    if sessions:
+        pipe.delete(*sessions)
+    pipe.delete(index)
+    pipe.execute()
+    
+    identity_cache.invalidate_user(user_id)
+    return len(sessions)
+
+def count(user_id):
+    return session_storage.zcard(_index_key(user_id))
+
+def _renew(session, user_id):
+    ttl = settings.SESSION_TTL
+    index = _index_key(user_id)
+    
+    pipe = session_storage.pipeline(transaction=False)
+    pipe.expire(session, ttl)
+    pipe.zadd(index, {session: time.time()})
+    pipe.expire(index, ttl)
+    pipe.execute()
+
+def _delete_sessions(index, sessions):
+    if not sessions:
+        return
+    pipe = session_storage.pipeline()
+    pipe.delete(*sessions)
+    pipe.zrem(index, *sessions)
+    pipe.execute()
+    for session in sessions:
+        identity_cache.invalidate_session(session)
+
+def _index_key(user_id):
+    return f"{INDEX_PREFIX}{user_id}"
+
+def _is_session_id(value):
+    # Ключи сессий - это UUID, остальные ключи Redis не должны читаться как сессии
+    try:
+        return str(uuid.UUID(value)) == value
+    except (ValueError, TypeError, AttributeError):
+        return False
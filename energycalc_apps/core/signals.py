@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog_cache, result_cache
+from .models import Device
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def device_changed(sender, instance, **kwargs):
+    """
+    Инвалидирует кеш каталога и закешированные результаты заявок с
+    устройством при любом изменении через ORM (API, админка, shell).
+    bulk_create/update сигналов не отправляют, импорт инвалидирует кеши сам.
+    """
+    device_id = instance.id
+
+    def invalidate():
+        catalog_cache.bump_version()
+        result_cache.invalidate_devices([device_id])
+
+    transaction.on_commit(invalidate)
@@ -0,0 +1,99 @@
+import json
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def is_streaming_requested(request):
+    return request.GET.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def stream_json_list(request, queryset, serialize_chunk, chunk_size=None):
+    """
+    Отдает результат запроса как JSON-массив по частям.
+    
+    Строки читаются серверным курсором (QuerySet.iterator) пачками по chunk_size,
+    serialize_chunk превращает пачку в список словарей. Ответ сжимается gzip
+    или brotli в зависимости от Accept-Encoding.
+    """
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    content = _json_chunks(queryset.iterator(chunk_size=chunk_size), serialize_chunk, chunk_size)
+    return streaming_response(request, content, 'application/json')
+
+def streaming_response(request, content, content_type):
+    """StreamingHttpResponse из итератора байтов со сжатием по Accept-Encoding"""
+    encoding = _negotiate_encoding(request)
+    if encoding is not None:
+        content = _compress(content, encoding)
+    
+    response = StreamingHttpResponse(content, content_type=content_type)
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+def _json_chunks(rows, serialize_chunk, chunk_size):
+    yield b'['
+    first = True
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield _encode_batch(serialize_chunk(batch), first)
+            first = False
+            batch = []
+    if batch:
+        yield _encode_batch(serialize_chunk(batch), first)
+    yield b']'
+
+def _encode_batch(items, first):
+    # Формат совпадает с JSONRenderer DRF: компактные разделители, UTF-8 без экранирования
+    encoded = ','.join(
+        json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+        for item in items
+    )
+    prefix = '' if first else ','
+    return (prefix + encoded).encode('utf-8')
+
+def _negotiate_encoding(request):
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+def _compress(chunks, encoding):
+    level = settings.STREAMING_COMPRESSION_LEVEL
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test.runner import DiscoverRunner
+
+from .redis import select_database
+
+class RedisTestRunner(DiscoverRunner):
+    """
+    Запускает тесты на отдельной базе Redis (REDIS_TEST_DB).
+
+    Тесты очищают Redis через flushdb; на рабочей базе это удалило бы
+    сессии, корзины и отзывы токенов локального окружения.
+    """
+    def setup_test_environment(self, **kwargs):
+        if settings.REDIS_TEST_DB == settings.REDIS_DB:
+            raise ImproperlyConfigured("REDIS_TEST_DB must differ from REDIS_DB")
+        super().setup_test_environment(**kwargs)
+        select_database(settings.REDIS_TEST_DB)
+
+    def teardown_test_environment(self, **kwargs):
+        select_database(settings.REDIS_DB)
+        super().teardown_test_environment(**kwargs)
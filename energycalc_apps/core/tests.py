@@ -0,0 +1,868 @@
+import base64
+import io
+import json
+import threading
+import time
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+import requests
+
+import redis
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.core import signing
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import (cart, catalog_cache, device_transfer, dispatch, engine, hashing, identity_cache, outbox, result_cache,
+               session_store, tokens)
+from .calculation import build_service_payloads
+from .models import Device, CalculationJob, CalculationRequest, DeviceInRequest, MyUser
+from .redis import current_database, session_storage
+from .serializers import DEVICE_FIELDS, DeviceSerializer, serialize_devices
+
+class RedisRoundTrips:
+    """Считает обращения к Redis: одиночные команды и выполнения pipeline"""
+    def __enter__(self):
+        self.count = 0
+        execute_command = session_storage.execute_command
+        pipeline_execute = redis.client.Pipeline.execute
+
+        def count_command(*args, **kwargs):
+            self.count += 1
+            return execute_command(*args, **kwargs)
+
+        def count_pipeline(pipe, *args, **kwargs):
+            self.count += 1
+            return pipeline_execute(pipe, *args, **kwargs)
+
+        self._patches = [
+            mock.patch.object(session_storage, 'execute_command', count_command),
+            mock.patch.object(redis.client.Pipeline, 'execute', count_pipeline),
+        ]
+        for patch in self._patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in reversed(self._patches):
+            patch.stop()
+
+def flush_redis():
+    """Очищает базу Redis для тестов; рабочую базу не трогает"""
+    if current_database() != settings.REDIS_TEST_DB:
+        raise AssertionError("tests must run with RedisTestRunner on REDIS_TEST_DB")
+    session_storage.flushdb()
+
+def user_queries(queries):
+    return [query for query in queries if 'FROM "myuser"' in query['sql']]
+
+def make_device(name, **fields):
+    values = {
+        'name': name, 'category': 'Освещение', 'image_url': f'{name}.png', 'power': 100,
+        'consumption': 1.5, 'peak_power': 150, 'voltage': '220 В', 'work_per_day': '8 ч',
+        'energy_class': 'A',
+    }
+    values.update(fields)
+    return Device.objects.create(**values)
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_X_SESSION_ID=session_store.create(user.id))
+    return client
+
+class IdentityResolutionTests(TestCase):
+    """Пользователь определяется один раз за запрос: один вызов Redis и один запрос к myuser"""
+    def setUp(self):
+        self.user = MyUser.objects.create_user(username='client', password='secret')
+        self.calculation_request = CalculationRequest.objects.create(
+            client=self.user, status=CalculationRequest.CalculationRequestStatus.FORMED
+        )
+        DeviceInRequest.objects.create(calculation_request=self.calculation_request,
+                                       device=make_device('Лампа'), quantity=2)
+        self.client = client_for(self.user)
+
+    def assertSingleIdentityLookup(self, method, url, data=None):
+        with RedisRoundTrips() as redis_calls, CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertEqual(redis_calls.count, 1)
+        self.assertEqual(len(user_queries(queries.captured_queries)), 1)
+
+    def test_search_requests(self):
+        self.assertSingleIdentityLookup('get', '/api/consumption-calc/')
+
+    def test_get_request_by_id(self):
+        self.assertSingleIdentityLookup('get', f'/api/consumption-calc/{self.calculation_request.id}/')
+
+    def test_update_request(self):
+        self.assertSingleIdentityLookup(
+            'put', f'/api/consumption-calc/{self.calculation_request.id}/update/', {'residents': 3}
+        )
+
+    def test_anonymous_request_has_no_user_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/consumption-calc/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(user_queries(queries.captured_queries), [])
+
+@override_settings(IDENTITY_CACHE_ENABLED=False)
+class RequestQueryCountTests(TestCase):
+    """Число запросов к БД не зависит от числа заявок и устройств в них"""
+    def setUp(self):
+        self.moderator = MyUser.objects.create_user(username='moderator', password='secret', is_moderator=True)
+        self.clients = [MyUser.objects.create(username=f'client{index}') for index in range(10)]
+        self.devices = [make_device(f'Устройство {index}') for index in range(5)]
+        self.client = client_for(self.moderator)
+
+    def create_request(self, client, devices):
+        calculation_request = CalculationRequest.objects.create(
+            client=client, moderator=self.moderator, status=CalculationRequest.CalculationRequestStatus.FORMED
+        )
+        for device in devices:
+            DeviceInRequest.objects.create(calculation_request=calculation_request, device=device, quantity=1)
+        return calculation_request
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_request_list(self):
+        for client in self.clients[:2]:
+            self.create_request(client, self.devices[:1])
+        expected = self.count_queries('/api/consumption-calc/')
+        for client in self.clients[2:]:
+            self.create_request(client, self.devices)
+        with self.assertNumQueries(expected):
+            response = self.client.get('/api/consumption-calc/')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_request_detail(self):
+        small = self.create_request(self.clients[0], self.devices[:1])
+        large = self.create_request(self.clients[1], self.devices)
+        expected = self.count_queries(f'/api/consumption-calc/{small.id}/')
+        with self.assertNumQueries(expected):
+            response = self.client.get(f'/api/consumption-calc/{large.id}/')
+        self.assertEqual(len(response.data['devices']), 5)
+
+def cursor(*position):
+    """Курсор KeysetCursorPagination с произвольной позицией"""
+    return base64.b64encode(urlencode({'p': json.dumps(position)}).encode()).decode()
+
+class RequestPaginationTests(TestCase):
+    def test_requests_created_at_the_same_time_are_paged_once(self):
+        user = MyUser.objects.create(username='client', is_moderator=True)
+        ids = [CalculationRequest.objects.create(client=user, status='FORMED').id for _ in range(5)]
+        CalculationRequest.objects.update(creation_datetime=CalculationRequest.objects.first().creation_datetime)
+        client = client_for(user)
+        pages = []
+        url = '/api/consumption-calc/?page_size=2'
+        while url:
+            response = client.get(url)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data['next']
+        newest_first = ids[::-1]
+        self.assertEqual(pages, [newest_first[0:2], newest_first[2:4], newest_first[4:]])
+
+    def test_cursor_with_invalid_values_is_rejected(self):
+        client = client_for(MyUser.objects.create(username='client', is_moderator=True))
+        response = client.get('/api/consumption-calc/', {'cursor': cursor('yesterday', '1')})
+        self.assertEqual(response.status_code, 404)
+
+class CalculationEngineTests(TestCase):
+    def test_halves_round_up(self):
+        moderator = MyUser.objects.create(username='moderator', is_moderator=True)
+        calculation_request = CalculationRequest.objects.create(
+            client=moderator, moderator=moderator, status=CalculationRequest.CalculationRequestStatus.FORMED
+        )
+        DeviceInRequest.objects.create(calculation_request=calculation_request,
+                                       device=make_device('Лампа', consumption=2.5), quantity=1)
+        self.assertEqual(engine.calculate_all(), 1)
+        calculation_request.refresh_from_db()
+        self.assertEqual(calculation_request.status, CalculationRequest.CalculationRequestStatus.COMPLETED)
+        self.assertEqual(calculation_request.result, 3)
+
+    def test_pending_jobs_are_not_dispatched_after_local_calculation(self):
+        moderator = MyUser.objects.create(username='moderator', is_moderator=True)
+        calculation_request = CalculationRequest.objects.create(
+            client=moderator, moderator=moderator, status=CalculationRequest.CalculationRequestStatus.FORMED
+        )
+        job = CalculationJob.objects.create(calculation_request=calculation_request, payload={})
+        self.assertEqual(engine.calculate_all(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalculationJob.CalculationJobStatus.DONE)
+        self.assertEqual(outbox.claim(10), [])
+
+class ApprovalTests(TestCase):
+    def setUp(self):
+        # Результат из кеша завершил бы заявку без задания
+        flush_redis()
+        self.moderator = MyUser.objects.create(username='moderator', is_moderator=True)
+        self.calculation_request = CalculationRequest.objects.create(
+            client=MyUser.objects.create(username='client'), status=CalculationRequest.CalculationRequestStatus.FORMED
+        )
+        DeviceInRequest.objects.create(calculation_request=self.calculation_request,
+                                       device=make_device('Лампа'), quantity=1)
+        self.client = client_for(self.moderator)
+
+    def test_repeated_approval_enqueues_one_job(self):
+        url = f'/api/consumption-calc/{self.calculation_request.id}/complete/'
+        self.assertEqual(self.client.put(url, {'action': 'complete'}, format='json').status_code, 200)
+        self.assertEqual(self.client.put(url, {'action': 'complete'}, format='json').status_code, 400)
+        url = f'/api/consumption-calc/{self.calculation_request.id}/status/'
+        self.assertEqual(self.client.put(url, {'status': 'COMPLETED'}, format='json').status_code, 400)
+        self.assertEqual(CalculationJob.objects.filter(calculation_request=self.calculation_request).count(), 1)
+
+    def test_approved_request_is_not_rejected(self):
+        url = f'/api/consumption-calc/{self.calculation_request.id}/complete/'
+        self.assertEqual(self.client.put(url, {'action': 'complete'}, format='json').status_code, 200)
+        response = self.client.put('/api/consumption-calc/moderate/',
+                                   {'ids': [self.calculation_request.id], 'action': 'reject'}, format='json')
+        self.assertEqual(response.data['results'][0]['outcome'], 'already_approved')
+        self.assertEqual(self.client.put(url, {'action': 'reject'}, format='json').status_code, 400)
+        url = f'/api/consumption-calc/{self.calculation_request.id}/status/'
+        self.assertEqual(self.client.put(url, {'status': 'REJECTED'}, format='json').status_code, 400)
+        self.calculation_request.refresh_from_db()
+        self.assertEqual(self.calculation_request.status, CalculationRequest.CalculationRequestStatus.FORMED)
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        flush_redis()
+        self.device = make_device('Лампа')
+        self.calculation_request = CalculationRequest.objects.create(
+            client=MyUser.objects.create(username='client'), status=CalculationRequest.CalculationRequestStatus.FORMED
+        )
+        DeviceInRequest.objects.create(calculation_request=self.calculation_request, device=self.device, quantity=2)
+        payload = build_service_payloads([(self.calculation_request.id, 1, 20)])[self.calculation_request.id]
+        self.fingerprint = result_cache.fingerprint(payload)
+        CalculationJob.objects.create(calculation_request=self.calculation_request, payload=payload,
+                                      fingerprint=self.fingerprint)
+
+    def receive_result(self, result):
+        with self.captureOnCommitCallbacks(execute=True):
+            return APIClient().put(f'/api/consumption-calc/result/{self.calculation_request.id}/',
+                                   {'token': settings.CALCULATION_SERVICE_TOKEN, 'result': result}, format='json')
+
+    def test_device_changes_invalidate_results(self):
+        result_cache.store_many([(self.fingerprint, [self.device.id], 5)])
+        # Изменение в обход update_device, например из админки
+        with self.captureOnCommitCallbacks(execute=True):
+            Device.objects.get(id=self.device.id).save()
+        self.assertIsNone(result_cache.lookup(self.fingerprint))
+
+        result_cache.store_many([(self.fingerprint, [self.device.id], 5)])
+        DeviceInRequest.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.device.delete()
+        self.assertIsNone(result_cache.lookup(self.fingerprint))
+
+    def test_result_for_formed_request_is_cached(self):
+        self.assertEqual(self.receive_result(7).status_code, 200)
+        self.assertEqual(result_cache.lookup(self.fingerprint), 7)
+
+    def test_result_for_rejected_request_is_not_cached(self):
+        self.calculation_request.status = CalculationRequest.CalculationRequestStatus.REJECTED
+        self.calculation_request.save()
+        self.receive_result(7)
+        self.assertIsNone(result_cache.lookup(self.fingerprint))
+
+    def test_engine_results_are_cached(self):
+        self.calculation_request.moderator = MyUser.objects.create(username='moderator', is_moderator=True)
+        self.calculation_request.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            engine.calculate_all()
+        self.calculation_request.refresh_from_db()
+        self.assertEqual(result_cache.lookup(self.fingerprint), self.calculation_request.result)
+
+def http_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b''
+    return response
+
+class DispatchClientTests(TestCase):
+    def setUp(self):
+        self.client = dispatch.DispatchClient(url='http://service/one', batch_url='http://service/batch',
+                                              batch_size=3, concurrency=1)
+        self.calls = []
+
+    def post(self, statuses):
+        def fake_post(url, json, timeout):
+            self.calls.append(url)
+            return http_response(statuses(url, json))
+        return mock.patch.object(self.client.session, 'post', fake_post)
+
+    def test_rejected_batch_falls_back_to_single_payloads(self):
+        def statuses(url, body):
+            if url.endswith('batch'):
+                return 404
+            return 400 if body['request_id'] == 2 else 200
+        
+        with self.post(statuses):
+            outcomes = self.client.send([{'request_id': 1}, {'request_id': 2}, {'request_id': 3}])
+        self.assertIsNone(outcomes[0])
+        self.assertIsInstance(outcomes[1], dispatch.RejectedError)
+        self.assertIsNone(outcomes[2])
+        self.assertEqual(self.calls, ['http://service/batch'] + ['http://service/one'] * 3)
+        self.assertEqual(self.client.breaker.state(), 'closed')
+
+    def test_server_errors_open_the_circuit(self):
+        with self.post(lambda url, body: 503), self.assertRaises(requests.HTTPError):
+            self.client.send([{'request_id': 1}, {'request_id': 2}])
+        with self.post(lambda url, body: 503):
+            outcomes = [self.client.send([{'request_id': index}])[0] for index in range(10)]
+        self.assertEqual(self.client.breaker.state(), 'open')
+        self.assertIsInstance(outcomes[0], requests.HTTPError)
+        self.assertIsInstance(outcomes[-1], dispatch.CircuitOpenError)
+
+class CartUpdateTests(TestCase):
+    URL = '/api/consumption-calc/cart/'
+
+    def setUp(self):
+        flush_redis()
+        self.user = MyUser.objects.create(username='client')
+        self.devices = [make_device(f'Устройство {index}') for index in range(6)]
+        self.client = client_for(self.user)
+
+    def update(self, items=(), remove=()):
+        items = [{'device_id': device.id, 'quantity': quantity} for device, quantity in items]
+        return self.client.put(self.URL, {'items': items, 'remove': [device.id for device in remove]}, format='json')
+
+    def lines(self):
+        return dict(DeviceInRequest.objects.filter(
+            calculation_request__client=self.user, calculation_request__status='DRAFT'
+        ).values_list('device_id', 'quantity'))
+
+    def test_quantities_are_replaced_and_lines_removed(self):
+        first, second, third = self.devices[:3]
+        self.assertEqual(self.update([(first, 2), (second, 1)]).status_code, 200)
+        self.assertEqual(self.update([(first, 2), (third, 4)], remove=[second]).status_code, 200)
+        self.assertEqual(self.lines(), {first.id: 2, third.id: 4})
+
+    def test_unknown_device_changes_nothing(self):
+        self.update([(self.devices[0], 1)])
+        response = self.client.put(self.URL, {'items': [{'device_id': self.devices[0].id, 'quantity': 3},
+                                                        {'device_id': 999999, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['device_ids'], [999999])
+        self.assertEqual(self.lines(), {self.devices[0].id: 1})
+
+    def test_out_of_range_quantity_is_rejected(self):
+        self.assertEqual(self.update([(self.devices[0], 2 ** 40)]).status_code, 400)
+        self.assertEqual(self.update([(self.devices[0], 0)]).status_code, 400)
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        self.update([(self.devices[0], 1)])
+        with CaptureQueriesContext(connection) as queries:
+            self.update([(self.devices[1], 1)], remove=[self.devices[0]])
+        with self.assertNumQueries(len(queries)):
+            self.update([(device, 2) for device in self.devices[2:]], remove=self.devices[:2])
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        flush_redis()
+        self.user = MyUser.objects.create(username='client')
+        self.devices = [make_device(f'Устройство {index}') for index in range(3)]
+        self.client = client_for(self.user)
+        self.set_cart(*self.devices[:2])
+        self.draft = CalculationRequest.objects.get(client=self.user, status='DRAFT')
+
+    def set_cart(self, *devices):
+        items = [{'device_id': device.id, 'quantity': 1} for device in devices]
+        self.client.put('/api/consumption-calc/cart/', {'items': items}, format='json')
+
+    def assertSummaryMatchesDatabase(self):
+        expected = (self.draft.id, DeviceInRequest.objects.filter(calculation_request=self.draft).count())
+        self.assertEqual(cart.summary(self.user.id), expected)
+
+    def race_with_reader(self, change):
+        """
+        Изменение фиксируется в БД, пока промах чтения сводки читает БД, а его
+        отложенные действия с Redis выполняются уже после записи сводки читателем.
+        """
+        load = cart._load
+
+        def racing_load(user_id):
+            with self.captureOnCommitCallbacks() as callbacks:
+                change()
+            self.pending = callbacks
+            return load(user_id)
+
+        with mock.patch.object(cart, '_load', racing_load):
+            cart.summary(self.user.id)
+        for callback in self.pending:
+            callback()
+
+    @skipUnless(connection.vendor == 'postgresql', "add_device использует INSERT ... RETURNING xmax")
+    def test_add_during_cache_fill(self):
+        self.race_with_reader(lambda: self.client.post(f'/api/devices/{self.devices[2].id}/add_to_request/'))
+        self.assertSummaryMatchesDatabase()
+
+    def test_cart_update_during_cache_fill(self):
+        self.race_with_reader(lambda: self.set_cart(self.devices[2]))
+        self.assertSummaryMatchesDatabase()
+
+    def test_remove_during_cache_fill(self):
+        self.race_with_reader(
+            lambda: self.client.delete(f'/api/consumption-calc/{self.draft.id}/devices/{self.devices[1].id}/delete/')
+        )
+        self.assertSummaryMatchesDatabase()
+
+@skipUnless(connection.vendor == 'postgresql', "параллельные транзакции проверяются только на PostgreSQL")
+class CartConcurrencyTests(TransactionTestCase):
+    def test_summary_consistent_after_concurrent_add_and_remove(self):
+        flush_redis()
+        user = MyUser.objects.create(username='client')
+        devices = [make_device(f'Устройство {index}') for index in range(20)]
+        session = session_store.create(user.id)
+        errors = []
+
+        def run(action):
+            client = APIClient()
+            client.credentials(HTTP_X_SESSION_ID=session)
+            try:
+                for device in devices:
+                    action(client, device)
+                    cart.summary(user.id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def add(client, device):
+            client.post(f'/api/devices/{device.id}/add_to_request/')
+
+        def remove(client, device):
+            draft = CalculationRequest.objects.filter(client=user, status='DRAFT').first()
+            if draft is not None:
+                client.delete(f'/api/consumption-calc/{draft.id}/devices/{device.id}/delete/')
+
+        threads = [threading.Thread(target=run, args=(action,)) for action in (add, add, remove, remove)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        draft = CalculationRequest.objects.get(client=user, status='DRAFT')
+        expected = (draft.id, DeviceInRequest.objects.filter(calculation_request=draft).count())
+        self.assertEqual(cart.summary(user.id), expected)
+
+    def test_concurrent_first_add_creates_single_draft(self):
+        user = MyUser.objects.create(username='client')
+        barrier = threading.Barrier(16)
+        drafts = []
+        errors = []
+
+        def run():
+            try:
+                barrier.wait()
+                drafts.append(cart.get_or_create_draft(user)[0].id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        draft = CalculationRequest.objects.get(client=user, status='DRAFT')
+        self.assertEqual(set(drafts), {draft.id})
+
+    def test_concurrent_adds_of_one_device_are_not_lost(self):
+        user = MyUser.objects.create(username='client')
+        device = make_device('Лампа')
+        session = session_store.create(user.id)
+        barrier = threading.Barrier(16)
+        statuses = []
+
+        def run():
+            client = APIClient()
+            client.credentials(HTTP_X_SESSION_ID=session)
+            try:
+                barrier.wait()
+                statuses.append(client.post(f'/api/devices/{device.id}/add_to_request/').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses, [200] * 16)
+
+        draft = CalculationRequest.objects.get(client=user, status='DRAFT')
+        line = DeviceInRequest.objects.get(calculation_request=draft)
+        self.assertEqual((line.device_id, line.quantity), (device.id, 16))
+
+@override_settings(SESSION_TTL=1000, SESSION_RENEW_INTERVAL=100, SESSION_MAX_PER_USER=3)
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        flush_redis()
+
+    def test_expired_session_is_not_found(self):
+        session = session_store.create(1)
+        self.assertEqual(session_store.lookup(session), 1)
+        session_storage.pexpire(session, 20)
+        time.sleep(0.05)
+        self.assertIsNone(session_store.lookup(session))
+
+    def test_session_is_renewed_after_interval(self):
+        session = session_store.create(1)
+        # Прошло меньше SESSION_RENEW_INTERVAL: TTL не продлевается
+        session_storage.expire(session, 950)
+        session_store.lookup(session)
+        self.assertLessEqual(session_storage.ttl(session), 950)
+
+        # Прошло 150 секунд: TTL и метка в индексе обновляются
+        session_storage.expire(session, 850)
+        session_storage.zadd(f'{session_store.INDEX_PREFIX}1', {session: time.time() - 150})
+        session_store.lookup(session)
+        self.assertGreater(session_storage.ttl(session), 990)
+        self.assertGreater(session_storage.zscore(f'{session_store.INDEX_PREFIX}1', session), time.time() - 10)
+
+    def test_oldest_session_is_evicted_at_cap(self):
+        # Сессии создаются в разные секунды, чтобы порядок в индексе был однозначным
+        clock = mock.Mock(time=mock.Mock(side_effect=[time.time() + index for index in range(4)]))
+        with mock.patch.object(session_store, 'time', clock):
+            sessions = [session_store.create(1) for _ in range(4)]
+        self.assertIsNone(session_store.lookup(sessions[0]))
+        self.assertEqual([session_store.lookup(session) for session in sessions[1:]], [1, 1, 1])
+        self.assertEqual(session_store.count(1), 3)
+
+    def test_delete_all_ends_only_users_sessions(self):
+        sessions = [session_store.create(1) for _ in range(2)]
+        other = session_store.create(2)
+        self.assertEqual(session_store.delete_all(1), 2)
+        self.assertEqual([session_store.lookup(session) for session in sessions], [None, None])
+        self.assertEqual(session_store.count(1), 0)
+        self.assertEqual(session_store.lookup(other), 2)
+
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        self.user = MyUser.objects.create_user(username='cached', password='secret', email='cached@example.com')
+        self.cache = identity_cache.IdentityCache(max_size=10, ttl=60)
+
+    def test_store_after_invalidation_is_rejected(self):
+        snapshot = identity_cache.UserSnapshot(self.user.id, self.user.username, False)
+        since = identity_cache.begin()
+        # Выход из системы обработан между чтением сессии из Redis и записью в кеш
+        self.cache.evict_session('session-1')
+        self.cache.set('session-1', snapshot, since)
+        self.assertIsNone(self.cache.get('session-1'))
+
+        since = identity_cache.begin()
+        self.cache.evict_user(self.user.id)
+        self.cache.set('session-2', snapshot, since)
+        self.assertIsNone(self.cache.get('session-2'))
+
+        since = identity_cache.begin()
+        self.cache.set('session-3', snapshot, since)
+        self.assertEqual(self.cache.get('session-3'), snapshot)
+
+    def test_built_user_save_keeps_other_columns(self):
+        user = identity_cache.build_user(identity_cache.UserSnapshot(self.user.id, 'renamed', False))
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, 'renamed')
+        self.assertEqual(self.user.email, 'cached@example.com')
+        self.assertTrue(self.user.check_password('secret'))
+
+class TokenTests(TestCase):
+    def setUp(self):
+        flush_redis()
+        tokens._reload()
+        self.user = MyUser.objects.create(username='client', is_moderator=True)
+
+    def test_issued_token_is_verified(self):
+        token = tokens.issue(self.user)
+        self.assertTrue(tokens.is_token(token))
+        self.assertEqual(tokens.verify(token), identity_cache.UserSnapshot(self.user.id, 'client', True))
+
+    def test_tampered_token_is_rejected(self):
+        token = tokens.issue(self.user)
+        value, signature = token.rsplit(':', 1)
+        forged = signing.dumps({"u": 999, "n": "admin", "m": 1, "j": "x"}, key='not-the-signing-key',
+                               salt=tokens.TOKEN_SALT, compress=True)
+        self.assertIsNone(tokens.verify(f"{value}:{signature[::-1]}"))
+        self.assertIsNone(tokens.verify(forged))
+
+    @override_settings(AUTH_TOKEN_TTL=3600)
+    def test_expired_token_is_rejected(self):
+        two_hours_ago = mock.Mock(time=mock.Mock(return_value=time.time() - 7200))
+        with mock.patch.object(signing, 'time', two_hours_ago):
+            token = tokens.issue(self.user)
+        self.assertIsNone(tokens.verify(token))
+
+    def test_revoke_rejects_only_that_token(self):
+        token, other = tokens.issue(self.user), tokens.issue(self.user)
+        tokens.revoke(token)
+        self.assertIsNone(tokens.verify(token))
+        self.assertIsNotNone(tokens.verify(other))
+
+    def test_revoke_all_rejects_earlier_tokens_only(self):
+        before = tokens.issue(self.user)
+        other_user = tokens.issue(MyUser.objects.create(username='other'))
+        tokens.revoke_all(self.user.id)
+        # Токен, выпущенный в ту же секунду после выхода на всех устройствах, действителен
+        after = tokens.issue(self.user)
+        self.assertIsNone(tokens.verify(before))
+        self.assertIsNotNone(tokens.verify(after))
+        self.assertIsNotNone(tokens.verify(other_user))
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        MyUser.objects.create_user(username='login', password='secret')
+
+    def login(self, password):
+        return APIClient().post('/api/users/login/', {'username': 'login', 'password': password}, format='json')
+
+    def test_login_goes_through_auth_backends(self):
+        failures = []
+        handler = lambda sender, **kwargs: failures.append(kwargs['credentials']['username'])
+        user_login_failed.connect(handler)
+        try:
+            self.assertEqual(self.login('wrong').status_code, 401)
+        finally:
+            user_login_failed.disconnect(handler)
+        self.assertEqual(failures, ['login'])
+        self.assertEqual(self.login('secret').status_code, 200)
+
+    def test_login_rejected_when_hashing_slots_are_busy(self):
+        with mock.patch.object(hashing, '_slots', mock.Mock(**{'acquire.return_value': False})):
+            response = self.login('secret')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+class DevicePaginationTests(TestCase):
+    def setUp(self):
+        self.ids = [make_device(f'Устройство {index}').id for index in range(5)]
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return ids
+
+    def test_pages_cover_catalog_once_in_both_directions(self):
+        forward = self.walk('/api/devices/?page_size=2', 'next')
+        self.assertEqual(forward, [self.ids[0:2], self.ids[2:4], self.ids[4:5]])
+
+        last_page = APIClient().get('/api/devices/?page_size=2').data['next']
+        last_page = APIClient().get(last_page).data['next']
+        backward = self.walk(APIClient().get(last_page).data['previous'], 'previous')
+        self.assertEqual(backward, [self.ids[2:4], self.ids[0:2]])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(APIClient().get('/api/devices/?cursor=cD1nYXJiYWdl').status_code, 404)
+        for position in (('A', 'notanint'), ('A', None), ('A', [1])):
+            response = APIClient().get('/api/devices/', {'cursor': cursor(*position)})
+            self.assertEqual(response.status_code, 404, position)
+        response = APIClient().get('/api/devices/', {'cursor': cursor('Устройство 1', str(self.ids[1]))})
+        self.assertEqual([row['id'] for row in response.data['results']], self.ids[2:])
+
+    @skipUnless(connection.vendor == 'postgresql', "ранжирование по сходству есть только в PostgreSQL")
+    def test_tied_search_ranks_are_paged_once(self):
+        # Сходство "ламп" со словом "Лампа" - недвоичная дробь, одинаковая у всех строк
+        ids = [make_device(f'Лампа {index}').id for index in range(7)]
+        pages = self.walk('/api/devices/?name=ламп&page_size=3', 'next')
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(sorted(sum(pages, [])), ids)
+
+CSV_HEADER = 'name,category,image_url,power,consumption,peak_power,voltage,work_per_day,energy_class\n'
+
+def import_csv(content):
+    return device_transfer.import_devices(device_transfer.iter_records(io.BytesIO(content), 'csv'))
+
+class DeviceImportTests(TestCase):
+    def test_reimport_updates_by_name(self):
+        report = import_csv((CSV_HEADER + 'Чайник,Кухня,k.png,2000,30,2200,220 В,1 ч,A\n').encode())
+        self.assertEqual((report['created'], report['updated']), (1, 0))
+        report = import_csv((CSV_HEADER + 'Чайник,Кухня,k.png,1800,25,2000,220 В,1 ч,A\n').encode())
+        self.assertEqual((report['created'], report['updated']), (0, 1))
+        self.assertEqual(list(Device.objects.values_list('name', 'power')), [('Чайник', 1800)])
+
+    def test_bad_rows_are_reported_and_rest_imported(self):
+        content = (
+            CSV_HEADER.encode()
+            + 'Лампа,Свет,l.png,10,1,12,220 В,5 ч,A\n'.encode()
+            + b'\xff\xfe,bad,b.png,1,1,1,1,1,A\n'
+            + b'x' * 200000 + b',x,x,1,1,1,1,1,A\n'
+            + 'Утюг,Быт,i.png,2000,10,2200,220 В,1 ч,B\n'.encode()
+        )
+        report = import_csv(content)
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['error_count'], 2)
+        self.assertEqual([error['errors'] for error in report['errors']][0], "Invalid UTF-8")
+        self.assertTrue(report['errors'][1]['errors'].startswith("Invalid CSV"))
+        self.assertEqual(set(Device.objects.values_list('name', flat=True)), {'Лампа', 'Утюг'})
+
+    def test_invalid_utf8_ndjson_line(self):
+        content = b'{"name": "\xff"}\n' + '{"name": "Фен"}\n'.encode()
+        records = list(device_transfer.iter_records(io.BytesIO(content), 'ndjson'))
+        self.assertIsInstance(records[0][1], ValueError)
+        self.assertEqual(records[1], (2, {'name': 'Фен'}))
+
+class DeviceRangeFilterTests(TestCase):
+    def test_out_of_range_and_non_finite_values_are_rejected(self):
+        for query in ('power_min=99999999999', 'peak_power_max=-3000000000', 'consumption_min=nan',
+                      'voltage_max=inf', 'work_per_day_min=1e400', 'power_min=abc'):
+            with self.subTest(query=query):
+                self.assertEqual(APIClient().get(f'/api/devices/?{query}').status_code, 400)
+
+    def test_valid_range(self):
+        make_device('Лампа', power=60)
+        make_device('Чайник', power=2000)
+        response = APIClient().get('/api/devices/?power_min=100&consumption_max=1e3')
+        self.assertEqual([row['name'] for row in response.data['results']], ['Чайник'])
+
+class DeviceSerializationTests(TestCase):
+    def test_fast_path_matches_model_serializer(self):
+        for image_url in ('lamp.png', 'images/kettle.png', 'http://old-host:9000/images/fridge.png', ''):
+            make_device(f'Устройство {image_url}', image_url=image_url)
+        devices = Device.objects.order_by('id')
+        self.assertEqual(serialize_devices(devices.values(*DEVICE_FIELDS)),
+                         DeviceSerializer(devices, many=True).data)
+
+@override_settings(CATALOG_CACHE_ENABLED=True)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        make_device('Чайник')
+        catalog_cache.bump_version()
+
+    def test_not_modified_after_entry_expired(self):
+        response = APIClient().get('/api/devices/')
+        etag = response['ETag']
+        for key in session_storage.scan_iter(f'{catalog_cache.ENTRY_PREFIX}*'):
+            session_storage.delete(key)
+        before = catalog_cache.stats()
+        response = APIClient().get('/api/devices/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        after = catalog_cache.stats()
+        self.assertEqual(after['not_modified'] - before['not_modified'], 1)
+        self.assertGreater(after['bytes_saved'] - before['bytes_saved'], 0)
+
+    def test_orm_change_invalidates_cached_catalog(self):
+        response = APIClient().get('/api/devices/')
+        etag = response['ETag']
+        # Изменение в обход представлений, например из админки
+        device = Device.objects.get()
+        device.power = 999
+        with self.captureOnCommitCallbacks(execute=True):
+            device.save()
+        response = APIClient().get('/api/devices/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['power'], 999)
+
+    def test_not_modified_only_for_current_body(self):
+        response = APIClient().get('/api/devices/')
+        etag = response['ETag']
+        # Счетчик версии сброшен (например, очисткой Redis), содержимое другое
+        session_storage.delete(catalog_cache.VERSION_KEY)
+        make_device('Утюг')
+        for key in session_storage.scan_iter(f'{catalog_cache.ENTRY_PREFIX}*'):
+            session_storage.delete(key)
+        self.assertEqual(APIClient().get('/api/devices/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        forged = '"' + etag.strip('"')[:-1] + '0' * 10 + '"'
+        self.assertEqual(APIClient().get('/api/devices/', HTTP_IF_NONE_MATCH=forged).status_code, 200)
+
+    def test_redis_outage_falls_through_to_view(self):
+        get = session_storage.get
+
+        def get_version_only(key):
+            if key.startswith(catalog_cache.ENTRY_PREFIX):
+                raise redis.ConnectionError()
+            return get(key)
+
+        with mock.patch.object(session_storage, 'get', get_version_only):
+            response = APIClient().get('/api/devices/')
+        self.assertEqual(response.status_code, 200)
+        with mock.patch.object(session_storage, 'set', side_effect=redis.ConnectionError):
+            response = APIClient().get('/api/devices/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_streaming_request_is_not_a_miss(self):
+        before = catalog_cache.stats()['misses']
+        response = APIClient().get('/api/devices/?stream=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(catalog_cache.stats()['misses'], before)
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}")
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+@skipUnless(connection.vendor == 'postgresql', "планы запросов проверяются только на PostgreSQL")
+class QueryPlanTestCase(TestCase):
+    """Проверка использования индексов по EXPLAIN запросов, выполненных представлением"""
+    def assertViewUsesIndex(self, url, table, *index_names, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or APIClient()).get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        statements = [query['sql'] for query in queries.captured_queries if f'FROM "{table}"' in query['sql']]
+        self.assertTrue(statements, f"no query against {table}")
+        plan = explain(statements[0])
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+class DeviceSearchPlanTests(QueryPlanTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO device (name, category, image_url, power, consumption, peak_power,
+                                    voltage, work_per_day, energy_class, voltage_volts, hours_per_day)
+                SELECT 'Устройство ' || i, 'Категория ' || (i % 20), i || '.png', i % 3000, 1.5, i % 4000,
+                       '220 В', '8 ч', chr(65 + i % 7), 220, 8
+                FROM generate_series(1, 100000) AS i
+            """)
+            cursor.execute("ANALYZE device")
+
+    def test_name_search_uses_trigram_index(self):
+        self.assertViewUsesIndex('/api/devices/?name=стройство 4242', 'device', 'device_name_trgm_idx')
+
+    def test_category_filter_uses_composite_index(self):
+        self.assertViewUsesIndex('/api/devices/?category=Категория 7&energy_class=C', 'device',
+                                 'device_category_class_idx')
+
+class RequestSearchPlanTests(QueryPlanTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = MyUser.objects.create(username='moderator', is_moderator=True)
+        cls.clients = MyUser.objects.bulk_create(MyUser(username=f'client{index}') for index in range(200))
+        first_client = min(client.id for client in cls.clients)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO "CalculationRequest" (status, residents, temperature, creation_datetime, client_id)
+                SELECT (ARRAY['DRAFT', 'DELETED', 'FORMED', 'COMPLETED', 'REJECTED'])[1 + i % 5], 1, 20,
+                       TIMESTAMPTZ '2024-01-01' + i * INTERVAL '30 seconds', %s + i % 200
+                FROM generate_series(1, 2000000) AS i
+            """, [first_client])
+            cursor.execute('ANALYZE "CalculationRequest"')
+
+    def test_moderator_list_uses_keyset_index(self):
+        client = client_for(self.moderator)
+        self.assertViewUsesIndex('/api/consumption-calc/', 'CalculationRequest',
+                                 'calcrequest_active_keyset_idx', client=client)
+        self.assertViewUsesIndex('/api/consumption-calc/?date_start=2024-06-01&date_end=2024-06-01',
+                                 'CalculationRequest', 'calcrequest_active_keyset_idx', client=client)
+
+    def test_client_list_uses_client_indexes(self):
+        client = client_for(self.clients[0])
+        self.assertViewUsesIndex('/api/consumption-calc/', 'CalculationRequest',
+                                 'calcrequest_client_keyset_idx', 'calcrequest_client_status_idx', client=client)
+        self.assertViewUsesIndex('/api/consumption-calc/?status=FORMED', 'CalculationRequest',
+                                 'calcrequest_client_status_idx', 'calcrequest_client_keyset_idx', client=client)
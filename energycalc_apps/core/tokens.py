@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+from .redis import session_storage
+from . import identity_cache
+
+TOKEN_SALT = 'energycalc.auth-token'
+REVOKED_TOKENS_KEY = 'auth_tokens:revoked'
+NOT_BEFORE_KEY = 'auth_tokens:not_before'
+
+# Локальные копии списка отозванных токенов, синхронизируются через pub/sub
+_revoked = {}
+_not_before = {}
+_loaded = False
+_lock = threading.Lock()
+
+def is_token(value):
+    # Подписанные токены содержат разделитель ":", идентификаторы сессий (UUID) - нет
+    return bool(value) and ':' in value
+
+def issue(user):
+    """
+    Выпускает подписанный токен с id пользователя, флагом модератора и jti.
+
+    Срок действия проверяется по метке времени подписи (AUTH_TOKEN_TTL).
+    Метка подписи целая, поэтому для сравнения с revoke_all в токене
+    хранится время выпуска с долями секунды (i).
+    """
+    payload = {
+        "u": user.id,
+        "n": user.username,
+        "m": int(user.is_moderator),
+        "j": uuid.uuid4().hex[:16],
+        "i": round(time.time(), 6),
+    }
+    return signing.dumps(payload, key=settings.AUTH_TOKEN_SIGNING_KEY, salt=TOKEN_SALT, compress=True)
+
+def verify(token):
+    """Возвращает UserSnapshot для действительного токена или None без обращения к сети"""
+    payload = _load(token)
+    if payload is None:
+        return None
+    
+    _ensure_loaded()
+    if payload["j"] in _revoked:
+        return None
+    if payload.get("i", payload["t"]) < _not_before.get(payload["u"], 0):
+        return None
+    return identity_cache.UserSnapshot(payload["u"], payload["n"], bool(payload["m"]))
+
+def revoke(token):
+    """Отзывает токен до истечения срока: запись в Redis и рассылка всем процессам"""
+    payload = _load(token)
+    if payload is None:
+        return
+    
+    expires_at = payload["t"] + settings.AUTH_TOKEN_TTL
+    pipe = session_storage.pipeline()
+    pipe.zadd(REVOKED_TOKENS_KEY, {payload["j"]: expires_at})
+    pipe.zremrangebyscore(REVOKED_TOKENS_KEY, '-inf', time.time())
+    pipe.execute()
+    identity_cache.publish(f"token:{payload['j']}:{expires_at}")
+
+def revoke_all(user_id):
+    """Отзывает все токены пользователя, выпущенные до текущего момента"""
+    now = round(time.time(), 6)
+    session_storage.hset(NOT_BEFORE_KEY, user_id, now)
+    identity_cache.publish(f"not_before:{user_id}:{now}")
+
+def _load(token):
+    try:
+        payload = signing.loads(
+            token,
+            key=settings.AUTH_TOKEN_SIGNING_KEY,
+            fallback_keys=settings.AUTH_TOKEN_FALLBACK_KEYS,
+            salt=TOKEN_SALT,
+            max_age=settings.AUTH_TOKEN_TTL,
+        )
+        payload["t"] = _issued_at(token)
+        return payload
+    except (signing.BadSignature, ValueError, TypeError, KeyError):
+        return None
+
+def _issued_at(token):
+    timestamp = token.rsplit(':', 2)[-2]
+    return signing.b62_decode(timestamp)
+
+def _ensure_loaded():
+    identity_cache.ensure_listener()
+    if not _loaded:
+        _reload()
+
+def _reload():
+    global _loaded
+    now = time.time()
+    revoked = session_storage.zrangebyscore(REVOKED_TOKENS_KEY, now, '+inf', withscores=True)
+    not_before = session_storage.hgetall(NOT_BEFORE_KEY)
+    with _lock:
+        _revoked.clear()
+        _revoked.update((jti.decode('utf-8'), expires_at) for jti, expires_at in revoked)
+        _not_before.clear()
+        _not_before.update((int(user_id), float(ts)) for user_id, ts in not_before.items())
+        _loaded = True
+
+def _on_revoked(value):
+    jti, _, expires_at = value.partition(':')
+    now = time.time()
+    with _lock:
+        _revoked[jti] = float(expires_at or now)
+        for expired in [j for j, exp in _revoked.items() if exp < now]:
+            del _revoked[expired]
+
+def _on_not_before(value):
+    user_id, _, ts = value.partition(':')
+    with _lock:
+        _not_before[int(user_id)] = float(ts)
+
+identity_cache.register_handler('token', _on_revoked, _reload)
+identity_cache.register_handler('not_before', _on_not_before)
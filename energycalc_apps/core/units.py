@@ -0,0 +1,20 @@
+import re
+
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+_MINUTES_MARKERS = ('мин', 'min')
+
+def parse_number(value):
+    """Первое число из строки вида "220 В", "220-240 В", "1,5 кВт" или None"""
+    match = _NUMBER_RE.search(value or '')
+    if match is None:
+        return None
+    return float(match.group().replace(',', '.'))
+
+def parse_hours(value):
+    """Время работы в часах из строки вида "8 ч", "24 часа", "30 мин" или None"""
+    number = parse_number(value)
+    if number is None:
+        return None
+    if any(marker in value.lower() for marker in _MINUTES_MARKERS):
+        return number / 60
+    return number
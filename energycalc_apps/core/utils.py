@@ -1,21 +1,119 @@
-from .redis import session_storage
+import functools
+from . import session_store, tokens
 from .models import MyUser
+from . import identity_cache
 from django.conf import settings
 
+_IDENTITY_ATTR = '_identity_user'
+
 def identity_user(request):
-    session = get_session(request)
+    """
+    Возвращает пользователя текущего запроса или None.
+
+    Результат кешируется на объекте HttpRequest, поэтому повторные вызовы
+    (классы прав доступа, представления) не обращаются к Redis и БД.
+    """
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, _IDENTITY_ATTR):
+        setattr(http_request, _IDENTITY_ATTR, _resolve_user(get_session(http_request)))
+    return getattr(http_request, _IDENTITY_ATTR)
+
+def identity_user_id(request):
+    """
+    Возвращает id пользователя текущего запроса или None без обращения к БД:
+    достаточно сессии в Redis, подписанного токена или кеша идентичности.
+    """
+    http_request = getattr(request, '_request', request)
+    if hasattr(http_request, _IDENTITY_ATTR):
+        user = getattr(http_request, _IDENTITY_ATTR)
+        return user.id if user else None
     
-    if session is None or not session_storage.exists(session):
+    session = get_session(http_request)
+    if session is None:
+        return None
+    
+    if tokens.is_token(session):
+        if settings.AUTH_MODE != 'token':
+            return None
+        snapshot = tokens.verify(session)
+        return snapshot.id if snapshot else None
+    
+    if identity_cache.enabled():
+        snapshot = identity_cache.lookup(session)
+        if snapshot is not None:
+            return snapshot.id
+    
+    return session_store.lookup(session)
+
+def _resolve_user(session):
+    if session is None:
+        return None
+    
+    if tokens.is_token(session):
+        if settings.AUTH_MODE != 'token':
+            return None
+        snapshot = tokens.verify(session)
+        return identity_cache.build_user(snapshot) if snapshot else None
+    
+    use_cache = identity_cache.enabled()
+    if use_cache:
+        snapshot = identity_cache.lookup(session)
+        if snapshot is not None:
+            return identity_cache.build_user(snapshot)
+        since = identity_cache.begin()
+    
+    user_id = session_store.lookup(session)
+    if user_id is None:
         return None
     
-    user_id = session_storage.get(session)
     try:
-        if isinstance(user_id, bytes):
-            user_id = user_id.decode('utf-8')
-        user = MyUser.objects.get(id=int(user_id))
-        return user
-    except (MyUser.DoesNotExist, ValueError, TypeError):
+        user = MyUser.objects.get(id=user_id)
+    except MyUser.DoesNotExist:
         return None
+    
+    if use_cache:
+        identity_cache.store(session, user, since)
+    return user
+
+def create_session(user):
+    """Выдает идентификатор сессии или подписанный токен в зависимости от AUTH_MODE"""
+    if settings.AUTH_MODE == 'token':
+        return tokens.issue(user)
+    return session_store.create(user.id)
+
+def destroy_session(session):
+    if tokens.is_token(session):
+        tokens.revoke(session)
+    else:
+        session_store.delete(session)
+
+def destroy_all_sessions(user_id):
+    sessions_count = session_store.delete_all(user_id)
+    if settings.AUTH_MODE == 'token':
+        tokens.revoke_all(user_id)
+    return sessions_count
+
+def session_max_age():
+    if settings.AUTH_MODE == 'token':
+        return settings.AUTH_TOKEN_TTL
+    return settings.SESSION_TTL
+
+def parse_fields(request, allowed):
+    """
+    Разбирает параметр ?fields=a,b,c (sparse fieldsets).
+    
+    Возвращает кортеж запрошенных полей в порядке allowed, либо allowed,
+    если параметр не передан. Для неизвестных полей выбрасывает ValueError.
+    """
+    raw = request.GET.get('fields')
+    if not raw:
+        return tuple(allowed)
+    
+    requested = {field.strip() for field in raw.split(',') if field.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in allowed if field in requested)
 
 def get_session(request):
     if 'HTTP_X_SESSION_ID' in request.META:
@@ -26,6 +124,12 @@ def get_session(request):
     
     return None
 
+@functools.lru_cache(maxsize=None)
+def get_minio_url_prefix():
+    """Префикс URL изображений MinIO, вычисляется один раз на процесс"""
+    protocol = 'https' if settings.USE_HTTPS else 'http'
+    return f"{protocol}://{settings.LOCAL_IP}:{settings.MINIO_PORT}/images/"
+
 def get_minio_url(image_path):
     """
     Генерирует полный URL для изображения в MinIO
@@ -39,5 +143,4 @@ def get_minio_url(image_path):
     if image_path.startswith('images/'):
         image_path = image_path.replace('images/', '', 1)
     
-    protocol = 'https' if settings.USE_HTTPS else 'http'
-    return f"{protocol}://{settings.LOCAL_IP}:{settings.MINIO_PORT}/images/{image_path}"
\ No newline at end of file
+    return get_minio_url_prefix() + image_path
\ No newline at end of file
@@ -1,6 +1,7 @@
-from django.contrib.auth import authenticate
+from django.conf import settings
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime, parse_date
+from django.db import transaction
 from django.db.models import Q
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
@@ -10,92 +11,102 @@ from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-import uuid
-import requests
-import threading
+from datetime import datetime, time, timedelta
 
 from .models import Device, CalculationRequest, DeviceInRequest, MyUser
 from .serializers import *
 from .minio import add_pic, delete_device_image
 from .permissions import IsModerator, IsOwner, IsOwnerOrReadOnly
-from .utils import identity_user, get_session
-from .redis import session_storage
-
-def calculate_base_consumption(calculation_request):
-    devices_in_request = DeviceInRequest.objects.filter(calculation_request=calculation_request)
-    total_consumption = 0
-    
-    for device_in_request in devices_in_request:
-        consumption_value = device_in_request.device.consumption
-        quantity = device_in_request.quantity
-        total_consumption += consumption_value * quantity
-    
-    return total_consumption
-
-ASYNC_SERVICE_URL = "http://localhost:8080/api/calculate"
-SECRET_TOKEN = "12345678"
-
-def call_async_service(calculation_request):
-    """Вызов асинхронного сервиса для расчета результата"""
-    devices_in_request = DeviceInRequest.objects.filter(calculation_request=calculation_request)
-    
-    devices_data = []
-    for device_in_request in devices_in_request:
-        devices_data.append({
-            "device": {
-                "id": device_in_request.device.id,
-                "consumption": float(device_in_request.device.consumption)
-            },
-            "quantity": device_in_request.quantity
-        })
-    
-    request_data = {
-        "request_id": calculation_request.id,
-        "residents": calculation_request.residents,
-        "temperature": calculation_request.temperature,
-        "devices": devices_data
-    }
-    
-    try:
-        def async_call():
-            response = requests.post(ASYNC_SERVICE_URL, json=request_data, timeout=5)
+from .pagination import DeviceCursorPagination, CalculationRequestCursorPagination
+from .search import filter_devices, is_ranked, parse_range_filters, RANGE_FILTERS
+from .streaming import is_streaming_requested, stream_json_list, streaming_response
+from . import device_transfer
+from .utils import get_session, identity_user_id, parse_fields, create_session, destroy_session, destroy_all_sessions, session_max_age
+from . import identity_cache, hashing, catalog_cache, outbox, results, moderation, cart, result_cache
+
+def fields_parameter(allowed):
+    return openapi.Parameter(
+        'fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+        description=f"Список полей через запятую (по умолчанию все): {', '.join(allowed)}"
+    )
+
+STREAM_PARAMETER = openapi.Parameter(
+    'stream', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+    description='Потоковая отдача всего списка без пагинации (сжатие по Accept-Encoding)'
+)
 
-        thread = threading.Thread(target=async_call)
-        thread.daemon = True
-        thread.start()
-    except Exception as e:
-        print(f"Error calling async service: {e}")
+def invalid_fields_response(error):
+    return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
 @swagger_auto_schema(
     method='get',
-    operation_description="GET список устройств с фильтрацией",
+    operation_description="GET список устройств с фильтрацией и курсорной пагинацией",
     manual_parameters=[
-        openapi.Parameter('name', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Название устройства')
+        openapi.Parameter('name', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Название устройства (нечеткий поиск, результаты по релевантности)'),
+        openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Категория'),
+        openapi.Parameter('energy_class', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Энергетический класс'),
+        openapi.Parameter('energy_class__in', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Энергетические классы через запятую'),
+        *[openapi.Parameter(param, openapi.IN_QUERY, type=openapi.TYPE_NUMBER) for param in RANGE_FILTERS],
+        openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Курсор страницы (поле next/previous ответа)'),
+        openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Размер страницы'),
+        fields_parameter(DEVICE_FIELDS),
+        STREAM_PARAMETER
     ]
 )
 @api_view(["GET"])
 @authentication_classes([])
 @permission_classes([])
+@catalog_cache.cached_response
 def search_devices(request):
-    device_name = request.GET.get("name", "")
-    
-    devices = Device.objects.all()
+    try:
+        fields = parse_fields(request, DEVICE_FIELDS)
+        ranges = parse_range_filters(request.GET)
+    except ValueError as e:
+        return invalid_fields_response(e)
+    
+    devices = filter_devices(
+        Device.objects.all(),
+        name=request.GET.get("name", ""),
+        category=request.GET.get("category", ""),
+        energy_class=request.GET.get("energy_class", ""),
+        ranges=ranges,
+    )
     
-    if device_name:
-        devices = devices.filter(name__icontains=device_name)
+    # Колонки сортировки нужны пагинатору для построения курсора
+    columns = {*fields, 'id', 'name'}
+    if is_ranked(devices):
+        columns.add('rank')
+    
+    if is_streaming_requested(request):
+        ordering = ('-rank', 'id') if is_ranked(devices) else DeviceCursorPagination.ordering
+        return stream_json_list(
+            request,
+            devices.order_by(*ordering).values(*columns),
+            lambda rows: serialize_devices(rows, fields),
+        )
     
-    serializer = DeviceSerializer(devices, many=True)
+    paginator = DeviceCursorPagination()
+    page = paginator.paginate_queryset(devices.values(*columns), request)
     
-    return Response(serializer.data)
+    return paginator.get_paginated_response(serialize_devices(page, fields))
 
-@swagger_auto_schema(method='get', operation_description="GET одна запись устройства")
+@swagger_auto_schema(
+    method='get',
+    operation_description="GET одна запись устройства",
+    manual_parameters=[fields_parameter(DEVICE_FIELDS)]
+)
 @api_view(["GET"])
 @authentication_classes([])
 @permission_classes([])
+@catalog_cache.cached_response
 def get_device_by_id(request, device_id):
-    device = get_object_or_404(Device, id=device_id)
-    serializer = DeviceSerializer(device)
-    return Response(serializer.data)
+    try:
+        fields = parse_fields(request, DEVICE_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(e)
+    
+    device = get_object_or_404(Device.objects.values(*fields), id=device_id)
+    return Response(serialize_devices([device], fields)[0])
 
 @swagger_auto_schema(method='post', operation_description="POST добавление устройства", request_body=DeviceSerializer)
 @api_view(["POST"])
@@ -149,87 +160,163 @@ def add_device_image(request, device_id):
     if not image:
         return Response({"error": "No image provided"}, status=status.HTTP_400_BAD_REQUEST)
     
-    result = add_pic(device, image)
-    return result
+    return add_pic(device, image)
+
+@swagger_auto_schema(
+    method='post',
+    operation_description="POST массовый импорт устройств из CSV/NDJSON (upsert по названию)",
+    manual_parameters=[
+        openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True),
+        openapi.Parameter('file_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(device_transfer.FORMATS),
+                          description='Формат файла, по умолчанию определяется по расширению')
+    ]
+)
+@api_view(["POST"])
+@permission_classes([IsModerator])
+def import_devices(request):
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    file_format = device_transfer.detect_format(upload.name, request.GET.get('file_format'))
+    if file_format is None:
+        return Response({"error": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    report = device_transfer.import_devices(device_transfer.iter_records(upload.file, file_format))
+    # bulk_create не отправляет post_save, версию каталога увеличиваем сами
+    if report["created"] or report["updated"]:
+        catalog_cache.bump_version()
+    
+    return Response(report)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="GET потоковая выгрузка каталога устройств в CSV/NDJSON",
+    manual_parameters=[
+        openapi.Parameter('file_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(device_transfer.FORMATS))
+    ]
+)
+@api_view(["GET"])
+@permission_classes([IsModerator])
+def export_devices(request):
+    file_format = request.GET.get('file_format', 'ndjson')
+    if file_format not in device_transfer.FORMATS:
+        return Response({"error": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = streaming_response(request, device_transfer.export_devices(file_format), content_type)
+    response['Content-Disposition'] = f'attachment; filename="devices.{file_format}"'
+    return response
 
 @swagger_auto_schema(method='post', operation_description="POST добавление в заявку-черновик")
 @api_view(["POST"])
 @permission_classes([IsOwner])
 def add_device_to_draft_request(request, device_id):
-    user = identity_user(request)
-    if not user:
+    user = request.user
+    if not user.is_authenticated:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-    device = get_object_or_404(Device, id=device_id)
-    
-    draft_request = CalculationRequest.objects.filter(
-        client=user,
-        status=CalculationRequest.CalculationRequestStatus.DRAFT
-    ).first()
-
-    if not draft_request:
-        draft_request = CalculationRequest.objects.create(
-            client=user,
-            status=CalculationRequest.CalculationRequestStatus.DRAFT,
-            residents=1,
-            temperature=20,
-            result=None
-        )
-
-    device_in_request, created = DeviceInRequest.objects.get_or_create(
-        calculation_request=draft_request,
-        device=device,
-        defaults={'quantity': 1}
-    )
     
-    if not created:
-        device_in_request.quantity += 1
-        device_in_request.save()
+    # Поиск/создание черновика и upsert строки - одна транзакция, 2 запроса в обычном случае
+    with transaction.atomic():
+        draft_request, draft_created = cart.get_or_create_draft(user)
+        line_created = cart.add_device(draft_request.id, device_id)
+        if line_created is None:
+            transaction.set_rollback(True)
+            return Response({"error": "Device not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        if draft_created or line_created:
+            cart.reset(user.id)
 
     serializer = CalculationRequestSerializer(draft_request)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
+@swagger_auto_schema(method='put', operation_description="PUT пакетное изменение корзины", request_body=CartUpdateSerializer)
+@api_view(["PUT"])
+@permission_classes([IsOwner])
+def update_cart(request):
+    """Установка количества и удаление нескольких устройств черновика в одной транзакции"""
+    user = request.user
+    if not user.is_authenticated:
+        return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    serializer = CartUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    items = serializer.validated_data['items']
+    remove = serializer.validated_data['remove']
+    
+    with transaction.atomic():
+        draft_request, draft_created = cart.get_or_create_draft(user)
+        missing = cart.apply_changes(draft_request, items, remove)
+        if missing:
+            transaction.set_rollback(True)
+            return Response({"error": "Devices not found", "device_ids": missing},
+                            status=status.HTTP_400_BAD_REQUEST)
+        cart.reset(user.id)
+        
+        draft_request.device_lines = list(
+            DeviceInRequest.objects.filter(calculation_request=draft_request).select_related('device')
+        )
+    
+    return Response(CalculationRequestDetailSerializer(draft_request).data)
+
 # Методы для заявок
+def start_of_day(day):
+    """
+    Начало дня в текущем часовом поясе.
+    
+    Фильтры по дате строятся как полуинтервалы [начало дня, начало следующего дня),
+    чтобы сравнение шло по самой колонке и могло использовать индекс.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
 @swagger_auto_schema(method='get', operation_description="GET иконки корзины")
 @api_view(["GET"])
+@authentication_classes([])
 @permission_classes([])
 def get_cart_icon(request):
-    user = identity_user(request)
+    """Сводка корзины из Redis: пользователь определяется только по id, без запросов к БД"""
+    user_id = identity_user_id(request)
     
-    if not user or not user.is_authenticated:
+    if user_id is None:
         response_data = {
             "draft_request_id": None,
             "devices_count": 0
         }
         return Response(response_data)
     
-    draft_request = CalculationRequest.objects.filter(
-        client=user,
-        status=CalculationRequest.CalculationRequestStatus.DRAFT
-    ).first()
-
+    draft_request_id, devices_count = cart.summary(user_id)
     response_data = {
-        "draft_request_id": draft_request.id if draft_request else None,
-        "devices_count": DeviceInRequest.objects.filter(calculation_request=draft_request).count() if draft_request else 0
+        "draft_request_id": draft_request_id,
+        "devices_count": devices_count
     }
     
     return Response(response_data)
 
 @swagger_auto_schema(
     method='get',
-    operation_description="GET список заявок с фильтрацией",
+    operation_description="GET список заявок с фильтрацией и курсорной пагинацией",
     manual_parameters=[
         openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING),
         openapi.Parameter('date_start', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Дата начала (YYYY-MM-DD)'),
-        openapi.Parameter('date_end', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Дата окончания (YYYY-MM-DD)')
+        openapi.Parameter('date_end', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Дата окончания (YYYY-MM-DD)'),
+        openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Курсор страницы (поле next/previous ответа)'),
+        openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Размер страницы'),
+        fields_parameter(CalculationRequestListSerializer.Meta.fields),
+        STREAM_PARAMETER
     ]
 )
 @api_view(["GET"])
 def search_requests(request):
-    user = identity_user(request)
+    user = request.user
     
-    if not user:
+    if not user.is_authenticated:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    try:
+        fields = parse_fields(request, CalculationRequestListSerializer.Meta.fields)
+    except ValueError as e:
+        return invalid_fields_response(e)
         
     status_filter = request.GET.get("status", "")
     date_start = request.GET.get("date_start")
@@ -254,34 +341,59 @@ def search_requests(request):
             date_start = date_start.split('T')[0]
         start_date = parse_date(date_start)
         if start_date:
-            requests = requests.filter(creation_datetime__date__gte=start_date)
+            requests = requests.filter(creation_datetime__gte=start_of_day(start_date))
     
     if date_end:
         if 'T' in date_end:
             date_end = date_end.split('T')[0]
         end_date = parse_date(date_end)
         if end_date:
-            requests = requests.filter(creation_datetime__date__lte=end_date)
+            requests = requests.filter(creation_datetime__lt=start_of_day(end_date + timedelta(days=1)))
     
-    serializer = CalculationRequestListSerializer(requests, many=True)
-    return Response(serializer.data)
+    requests = CalculationRequestListSerializer.restrict_queryset(
+        requests, fields, extra_columns=('creation_datetime',)
+    )
+    
+    if is_streaming_requested(request):
+        return stream_json_list(
+            request,
+            requests.order_by('id'),
+            lambda rows: CalculationRequestListSerializer(rows, many=True, fields=fields).data,
+        )
+    
+    paginator = CalculationRequestCursorPagination()
+    page = paginator.paginate_queryset(requests, request)
+    serializer = CalculationRequestListSerializer(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
 
-@swagger_auto_schema(method='get', operation_description="GET одна запись заявки")
+@swagger_auto_schema(
+    method='get',
+    operation_description="GET одна запись заявки",
+    manual_parameters=[fields_parameter(CalculationRequestDetailSerializer.Meta.fields)]
+)
 @api_view(["GET"])
 def get_request_by_id(request, request_id):
-    user = identity_user(request)
-    if not user:
+    user = request.user
+    if not user.is_authenticated:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-    calculation_request = get_object_or_404(CalculationRequest, id=request_id)
     
-    if not user.is_moderator and calculation_request.client != user:
+    try:
+        fields = parse_fields(request, CalculationRequestDetailSerializer.Meta.fields)
+    except ValueError as e:
+        return invalid_fields_response(e)
+    
+    requests = CalculationRequestDetailSerializer.restrict_queryset(
+        CalculationRequest.objects.all(), fields, extra_columns=('status', 'client')
+    )
+    calculation_request = get_object_or_404(requests, id=request_id)
+    
+    if not user.is_moderator and calculation_request.client_id != user.id:
         return Response({"error": "Access denied"}, status=status.HTTP_403_FORBIDDEN)
     
     if calculation_request.status == CalculationRequest.CalculationRequestStatus.DELETED:
         return Response({"error": "Request not found"}, status=status.HTTP_404_NOT_FOUND)
     
-    serializer = CalculationRequestDetailSerializer(calculation_request)
+    serializer = CalculationRequestDetailSerializer(calculation_request, fields=fields)
     return Response(serializer.data)
 
 @swagger_auto_schema(method='put', operation_description="PUT изменения полей заявки", request_body=CalculationRequestSerializer)
@@ -325,6 +437,7 @@ def form_request(request, request_id):
     calculation_request.status = CalculationRequest.CalculationRequestStatus.FORMED
     calculation_request.formation_datetime = timezone.now()
     calculation_request.save()
+    cart.reset(calculation_request.client_id)
     
     serializer = CalculationRequestSerializer(calculation_request)
     return Response(serializer.data)
@@ -342,29 +455,66 @@ def form_request(request, request_id):
 @api_view(["PUT"])
 @permission_classes([IsModerator])
 def complete_request(request, request_id):
-    calculation_request = get_object_or_404(CalculationRequest, id=request_id)
     action = request.data.get("action")
     
-    if calculation_request.status != CalculationRequest.CalculationRequestStatus.FORMED:
-        return Response({"error": "Only formed requests can be completed/rejected"}, 
-                       status=status.HTTP_400_BAD_REQUEST)
-    
-    if action == "complete":
-        call_async_service(calculation_request)
-        calculation_request.moderator = identity_user(request)
-        calculation_request.completion_datetime = timezone.now()
-        calculation_request.save()
-    elif action == "reject":
-        calculation_request.status = CalculationRequest.CalculationRequestStatus.REJECTED
-        calculation_request.moderator = identity_user(request)
-        calculation_request.completion_datetime = timezone.now()
-        calculation_request.save()
-    else:
-        return Response({"error": "Invalid action"}, status=status.HTTP_400_BAD_REQUEST)
+    # Заявка блокируется до конца транзакции: параллельное одобрение ждет
+    # и видит уже измененный статус, поэтому задание не ставится дважды
+    with transaction.atomic():
+        calculation_request = get_object_or_404(CalculationRequest.objects.select_for_update(), id=request_id)
+        
+        if calculation_request.status != CalculationRequest.CalculationRequestStatus.FORMED:
+            return Response({"error": "Only formed requests can be completed/rejected"}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        if action in ("complete", "reject") and calculation_request.moderator_id is not None:
+            return Response({"error": "Request is already approved and awaiting its result"},
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        if action == "complete":
+            calculation_request.moderator = request.user
+            calculation_request.completion_datetime = timezone.now()
+            calculation_request.save()
+            outbox.enqueue(calculation_request)
+        elif action == "reject":
+            calculation_request.status = CalculationRequest.CalculationRequestStatus.REJECTED
+            calculation_request.moderator = request.user
+            calculation_request.completion_datetime = timezone.now()
+            calculation_request.save()
+        else:
+            return Response({"error": "Invalid action"}, status=status.HTTP_400_BAD_REQUEST)
     
     serializer = CalculationRequestSerializer(calculation_request)
     return Response(serializer.data)
 
+@swagger_auto_schema(
+    method='put',
+    operation_description="PUT пакетное одобрение/отклонение заявок модератором",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            'action': openapi.Schema(type=openapi.TYPE_STRING, description='"complete" или "reject"')
+        },
+        required=['ids', 'action']
+    )
+)
+@api_view(["PUT"])
+@permission_classes([IsModerator])
+def moderate_requests(request):
+    request_ids = request.data.get("ids")
+    action = request.data.get("action")
+    
+    if action not in moderation.ACTIONS:
+        return Response({"error": "Invalid action"}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(request_ids, list):
+        return Response({"error": "ids must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(request_ids) > settings.MODERATION_MAX_BATCH:
+        return Response({"error": f"At most {settings.MODERATION_MAX_BATCH} requests per call"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    updated, outcomes = moderation.moderate_requests(request_ids, action, request.user)
+    return Response({"updated": updated, "results": outcomes})
+
 @swagger_auto_schema(
     method='put',
     operation_description="PUT получение результата от асинхронного сервиса",
@@ -386,18 +536,62 @@ def receive_calculation_result(request, request_id):
     token = request.data.get("token")
     result_value = request.data.get("result")
     
-    if token != SECRET_TOKEN:
+    if token != settings.CALCULATION_SERVICE_TOKEN:
         return Response({"error": "Invalid token"}, status=status.HTTP_403_FORBIDDEN)
     
-    calculation_request = get_object_or_404(CalculationRequest, id=request_id)
-    
-    calculation_request.result = result_value
-    calculation_request.status = CalculationRequest.CalculationRequestStatus.COMPLETED
-    calculation_request.save()
+    with transaction.atomic():
+        calculation_request = get_object_or_404(CalculationRequest.objects.select_for_update(), id=request_id)
+        awaiting_result = calculation_request.status == CalculationRequest.CalculationRequestStatus.FORMED
+        
+        calculation_request.result = result_value
+        calculation_request.status = CalculationRequest.CalculationRequestStatus.COMPLETED
+        calculation_request.save()
+        # Результат для отклоненной или удаленной заявки не кешируем
+        if awaiting_result and isinstance(result_value, int):
+            result_cache.remember_results({calculation_request.id: result_value})
     
     serializer = CalculationRequestSerializer(calculation_request)
     return Response(serializer.data)
 
+@swagger_auto_schema(
+    method='put',
+    operation_description="PUT пакетное получение результатов от асинхронного сервиса",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'token': openapi.Schema(type=openapi.TYPE_STRING),
+            'results': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'request_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'result': openapi.Schema(type=openapi.TYPE_INTEGER)
+                    }
+                )
+            )
+        },
+        required=['token', 'results']
+    )
+)
+@api_view(["PUT"])
+@authentication_classes([])
+@permission_classes([])
+def receive_calculation_results(request):
+    """Endpoint для пакетного получения результатов расчета от асинхронного сервиса"""
+    if request.data.get("token") != settings.CALCULATION_SERVICE_TOKEN:
+        return Response({"error": "Invalid token"}, status=status.HTTP_403_FORBIDDEN)
+    
+    entries = request.data.get("results")
+    if not isinstance(entries, list):
+        return Response({"error": "results must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(entries) > settings.CALCULATION_RESULTS_MAX_BATCH:
+        return Response({"error": f"At most {settings.CALCULATION_RESULTS_MAX_BATCH} results per call"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    completed, outcomes = results.ingest_results(entries)
+    return Response({"completed": completed, "results": outcomes})
+
 @swagger_auto_schema(
     method='put',
     operation_description="PUT изменение статуса заявки модератором",
@@ -410,18 +604,16 @@ def receive_calculation_result(request, request_id):
     )
 )
 @api_view(["PUT"])
-@authentication_classes([])
 @permission_classes([])
 def update_request_status(request, request_id):
     """Изменение статуса заявки модератором"""
-    user = identity_user(request)
-    if not user:
+    user = request.user
+    if not user.is_authenticated:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
     
     if not user.is_moderator:
         return Response({"error": "Moderator access required"}, status=status.HTTP_403_FORBIDDEN)
     
-    calculation_request = get_object_or_404(CalculationRequest, id=request_id)
     new_status = request.data.get("status")
     
     if new_status not in [CalculationRequest.CalculationRequestStatus.COMPLETED, 
@@ -429,30 +621,41 @@ def update_request_status(request, request_id):
         return Response({"error": "Invalid status. Only COMPLETED or REJECTED allowed"}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    if calculation_request.status == CalculationRequest.CalculationRequestStatus.DELETED:
-        return Response({"error": "Cannot change status of deleted request"}, 
-                       status=status.HTTP_400_BAD_REQUEST)
-    
-    if new_status == CalculationRequest.CalculationRequestStatus.COMPLETED:
-        # Если одобряем заявку со статусом FORMED, вызываем асинхронный сервис для расчета результата
-        if calculation_request.status == CalculationRequest.CalculationRequestStatus.FORMED:
-            # Вызываем асинхронный сервис для расчета результата
-            call_async_service(calculation_request)
-            # Статус остается FORMED до получения результата от асинхронного сервиса
-            calculation_request.moderator = user
-            calculation_request.completion_datetime = timezone.now()
-            calculation_request.save()
-        else:
-            # Если заявка уже имеет результат или статус не FORMED, просто меняем статус
+    # Статус проверяется и меняется под блокировкой строки заявки
+    with transaction.atomic():
+        calculation_request = get_object_or_404(CalculationRequest.objects.select_for_update(), id=request_id)
+        
+        if calculation_request.status == CalculationRequest.CalculationRequestStatus.DELETED:
+            return Response({"error": "Cannot change status of deleted request"}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        if new_status == CalculationRequest.CalculationRequestStatus.COMPLETED:
+            # Если одобряем заявку со статусом FORMED, отправляем ее на расчет через очередь заданий
+            if calculation_request.status == CalculationRequest.CalculationRequestStatus.FORMED:
+                if calculation_request.moderator_id is not None:
+                    return Response({"error": "Request is already approved and awaiting its result"},
+                                   status=status.HTTP_400_BAD_REQUEST)
+                # Статус остается FORMED до получения результата от асинхронного сервиса,
+                # задание на расчет ставится в очередь в той же транзакции
+                calculation_request.moderator = user
+                calculation_request.completion_datetime = timezone.now()
+                calculation_request.save()
+                outbox.enqueue(calculation_request)
+            else:
+                # Если заявка уже имеет результат или статус не FORMED, просто меняем статус
+                calculation_request.status = new_status
+                calculation_request.moderator = user
+                calculation_request.completion_datetime = timezone.now()
+                calculation_request.save()
+        elif new_status == CalculationRequest.CalculationRequestStatus.REJECTED:
+            if (calculation_request.status == CalculationRequest.CalculationRequestStatus.FORMED
+                    and calculation_request.moderator_id is not None):
+                return Response({"error": "Request is already approved and awaiting its result"},
+                               status=status.HTTP_400_BAD_REQUEST)
             calculation_request.status = new_status
             calculation_request.moderator = user
             calculation_request.completion_datetime = timezone.now()
             calculation_request.save()
-    elif new_status == CalculationRequest.CalculationRequestStatus.REJECTED:
-        calculation_request.status = new_status
-        calculation_request.moderator = user
-        calculation_request.completion_datetime = timezone.now()
-        calculation_request.save()
     
     serializer = CalculationRequestSerializer(calculation_request)
     return Response(serializer.data)
@@ -469,6 +672,7 @@ def delete_request(request, request_id):
     
     calculation_request.status = CalculationRequest.CalculationRequestStatus.DELETED
     calculation_request.save()
+    cart.reset(calculation_request.client_id)
     
     return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -486,7 +690,8 @@ def delete_device_from_request(request, request_id, device_id):
     device_in_request.delete()
     
     calculation_request = get_object_or_404(CalculationRequest, id=request_id)
-    devices = DeviceInRequest.objects.filter(calculation_request=calculation_request)
+    cart.reset(calculation_request.client_id)
+    devices = DeviceInRequest.objects.filter(calculation_request=calculation_request).select_related('device')
     serializer = DeviceInRequestSerializer(devices, many=True)
     
     return Response(serializer.data)
@@ -510,6 +715,12 @@ def update_device_in_request(request, request_id, device_id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Методы аутентификации
+def hasher_busy_response():
+    response = Response({"error": "Too many authentication requests, try again later"},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(settings.PASSWORD_HASHING_RETRY_AFTER)
+    return response
+
 @swagger_auto_schema(method='post', operation_description="POST регистрация", request_body=UserRegisterSerializer)
 @api_view(["POST"])
 @authentication_classes([])
@@ -518,16 +729,18 @@ def register_user(request):
     serializer = UserRegisterSerializer(data=request.data)
     
     if serializer.is_valid():
-        user = serializer.save()
+        try:
+            user = serializer.save()
+        except hashing.HasherBusy:
+            return hasher_busy_response()
         
-        session_id = str(uuid.uuid4())
-        session_storage.set(session_id, user.id)
+        session_id = create_session(user)
         
         response_data = MyUserSerializer(user).data
         response_data['session_id'] = session_id
         
         response = Response(response_data, status=status.HTTP_201_CREATED)
-        response.set_cookie("session_id", session_id, httponly=False, max_age=86400 * 30, path="/", domain=None, samesite='Lax')  # 30 дней
+        response.set_cookie("session_id", session_id, httponly=False, max_age=session_max_age(), path="/", domain=None, samesite='Lax')
         return response
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -535,8 +748,8 @@ def register_user(request):
 @swagger_auto_schema(method='get', operation_description="GET профиль пользователя")
 @api_view(["GET"])
 def get_user_profile(request, user_id):
-    user = identity_user(request)
-    if not user:
+    user = request.user
+    if not user.is_authenticated:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
     if user.id != user_id and not user.is_moderator:
@@ -550,8 +763,8 @@ def get_user_profile(request, user_id):
 @csrf_exempt
 @api_view(["PUT"])
 def update_user_profile(request, user_id):
-    user = identity_user(request)
-    if not user:
+    user = request.user
+    if not user.is_authenticated:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
     if user.id != user_id:
@@ -562,6 +775,7 @@ def update_user_profile(request, user_id):
     
     if serializer.is_valid():
         serializer.save()
+        identity_cache.invalidate_user(user_obj.id)
         return Response(serializer.data)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -574,17 +788,20 @@ def login_user(request):
     username = request.data.get('username')
     password = request.data.get('password')
     
-    user = authenticate(username=username, password=password)
+    try:
+        user = hashing.authenticate(request, username, password)
+    except hashing.HasherBusy:
+        return hasher_busy_response()
+    
     if user is not None:
         # Создаем сессию в Redis
-        session_id = str(uuid.uuid4())
-        session_storage.set(session_id, user.id)
+        session_id = create_session(user)
         
         response_data = MyUserSerializer(user).data
         response_data['session_id'] = session_id
         
         response = Response(response_data)
-        response.set_cookie("session_id", session_id, httponly=False, max_age=86400 * 30, path="/", domain=None, samesite='Lax')  # 30 дней
+        response.set_cookie("session_id", session_id, httponly=False, max_age=session_max_age(), path="/", domain=None, samesite='Lax')
         return response
     
     return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -597,8 +814,35 @@ def login_user(request):
 def logout_user(request):
     session = get_session(request)
     if session:
-        session_storage.delete(session)
+        destroy_session(session)
     
     response = Response({"message": "Logged out successfully"})
     response.delete_cookie('session_id')
-    return response
\ No newline at end of file
+    return response
+
+@swagger_auto_schema(method='post', operation_description="POST деавторизация на всех устройствах")
+@csrf_exempt
+@api_view(["POST"])
+@permission_classes([])
+def logout_all_sessions(request):
+    user = request.user
+    if not user.is_authenticated:
+        return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    sessions_count = destroy_all_sessions(user.id)
+    
+    response = Response({"message": "Logged out from all sessions", "sessions_count": sessions_count})
+    response.delete_cookie('session_id')
+    return response
+
+# Метрики
+@swagger_auto_schema(method='get', operation_description="GET метрики кешей текущего процесса")
+@api_view(["GET"])
+@permission_classes([IsModerator])
+def get_metrics(request):
+    return Response({
+        "identity_cache": identity_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "calculation_outbox": outbox.stats(),
+        "result_cache": result_cache.stats(),
+    })
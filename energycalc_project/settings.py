@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'energycalc_apps.core',
 
     #DRF
@@ -141,6 +142,11 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Число одновременных хеширований паролей в процессе,
+# при превышении login/register отвечают 503 с заголовком Retry-After
+PASSWORD_HASHING_CONCURRENCY = 2
+PASSWORD_HASHING_RETRY_AFTER = 1  # секунд
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -170,13 +176,90 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.MyUser'
 
+TEST_RUNNER = 'energycalc_apps.core.test_runner.RedisTestRunner'
+
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
+REDIS_DB = 0
+# Тесты работают с отдельной базой Redis и очищают ее (energycalc_apps.core.test_runner)
+REDIS_TEST_DB = 15
+REDIS_MAX_CONNECTIONS = 50
+REDIS_POOL_TIMEOUT = 5  # секунд ожидания свободного соединения
+REDIS_SOCKET_TIMEOUT = 5
+
+# Сессии в Redis
+SESSION_TTL = 86400 * 30  # 30 дней
+SESSION_RENEW_INTERVAL = 86400  # продлевать сессию не чаще раза в сутки
+SESSION_MAX_PER_USER = 10
+
+# Режим аутентификации: 'session' - сессии в Redis, 'token' - подписанные токены
+AUTH_MODE = 'session'
+AUTH_TOKEN_TTL = 86400  # секунд
+AUTH_TOKEN_SIGNING_KEY = SECRET_KEY
+AUTH_TOKEN_FALLBACK_KEYS = []  # предыдущие ключи на время ротации
+
+# Кеш session_id -> пользователь внутри процесса (инвалидация через Redis pub/sub)
+IDENTITY_CACHE_ENABLED = False
+IDENTITY_CACHE_MAX_SIZE = 10000
+IDENTITY_CACHE_TTL = 60  # секунд
+
+# Пагинация каталога устройств
+DEVICES_PAGE_SIZE = 50
+DEVICES_MAX_PAGE_SIZE = 500
+
+# Пагинация списка заявок
+REQUESTS_PAGE_SIZE = 50
+REQUESTS_MAX_PAGE_SIZE = 500
+
+# Кеш ответов каталога в Redis (ETag / If-None-Match), включается явно
+CATALOG_CACHE_ENABLED = False
+CATALOG_CACHE_TTL = 300  # секунд
+
+# Потоковая отдача больших списков (?stream=1)
+STREAMING_CHUNK_SIZE = 2000
+STREAMING_COMPRESSION_LEVEL = 5
+
+# Массовый импорт устройств
+DEVICE_IMPORT_CHUNK_SIZE = 1000
+DEVICE_IMPORT_MAX_ERRORS = 1000
+
+# Локальный пакетный расчет результатов (manage.py calculate_results)
+CALCULATION_ENGINE_BATCH_SIZE = 10000
+CALCULATION_ENGINE_UPDATE_BATCH_SIZE = 1000
+
+# Сервис расчета и outbox-очередь заданий (manage.py run_calculation_worker)
+CALCULATION_SERVICE_URL = "http://localhost:8080/api/calculate"
+CALCULATION_SERVICE_TOKEN = "12345678"
+CALCULATION_SERVICE_BATCH_URL = "http://localhost:8080/api/calculate/batch"
+# 1 - отправлять задания по одному на CALCULATION_SERVICE_URL;
+# больше 1 - только если сервис расчета поддерживает CALCULATION_SERVICE_BATCH_URL
+CALCULATION_SERVICE_BATCH_SIZE = 1
+CALCULATION_SERVICE_CONNECT_TIMEOUT = 2
+CALCULATION_SERVICE_TIMEOUT = 5
+CALCULATION_SERVICE_FAILURE_THRESHOLD = 5
+CALCULATION_SERVICE_RESET_TIMEOUT = 30
+CALCULATION_RESULTS_MAX_BATCH = 5000
+MODERATION_MAX_BATCH = 5000
+OUTBOX_WORKER_CONCURRENCY = 8
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_POLL_INTERVAL = 1
+OUTBOX_COALESCE_WINDOW = 0.2
+OUTBOX_LEASE_SECONDS = 60
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_DELAY = 2
+OUTBOX_RETRY_MAX_DELAY = 600
+
+# Сводка корзины (заявка-черновик и число устройств) в Redis
+CART_SUMMARY_TTL = 86400
+CART_MAX_BATCH = 500
+
+# Кеш результатов расчета по отпечатку заявки (LRU в Redis)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MAX_ENTRIES = 100000
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'energycalc_apps.core.authentication.RedisSessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -27,6 +27,8 @@ urlpatterns = [
     path('api/devices/', views.search_devices, name='search_devices'),# GET
     path('api/devices/<int:device_id>/', views.get_device_by_id, name='get_device_by_id'),# GET
     path('api/devices/create/', views.create_device, name='create_device'),# POST
+    path('api/devices/import/', views.import_devices, name='import_devices'),# POST
+    path('api/devices/export/', views.export_devices, name='export_devices'),# GET
     path('api/devices/<int:device_id>/update/', views.update_device, name='update_device'),# PUT
     path('api/devices/<int:device_id>/delete/', views.delete_device, name='delete_device'),# DELETE
     path('api/devices/<int:device_id>/add_image/', views.add_device_image, name='add_device_image'),# POST
@@ -34,13 +36,16 @@ urlpatterns = [
     
     # методы для заявок CalculationRequest
     path('api/consumption-calc/cart_icon/', views.get_cart_icon, name='get_cart_icon'),# GET
+    path('api/consumption-calc/cart/', views.update_cart, name='update_cart'),# PUT
     path('api/consumption-calc/', views.search_requests, name='search_requests'),# GET
     path('api/consumption-calc/<int:request_id>/', views.get_request_by_id, name='get_request_by_id'),# GET
     path('api/consumption-calc/<int:request_id>/update/', views.update_request, name='update_request'),# PUT
     path('api/consumption-calc/<int:request_id>/form/', views.form_request, name='form_request'),# PUT
+    path('api/consumption-calc/moderate/', views.moderate_requests, name='moderate_requests'),# PUT
     path('api/consumption-calc/<int:request_id>/complete/', views.complete_request, name='complete_request'),# PUT
     path('api/consumption-calc/<int:request_id>/status/', views.update_request_status, name='update_request_status'),# PUT
     path('api/consumption-calc/result/<int:request_id>/', views.receive_calculation_result, name='receive_calculation_result'),# PUT
+    path('api/consumption-calc/results/', views.receive_calculation_results, name='receive_calculation_results'),# PUT
     path('api/consumption-calc/<int:request_id>/delete/', views.delete_request, name='delete_request'),# DELETE
     
     # методы для М-М DeviceInRequest
@@ -55,6 +60,10 @@ urlpatterns = [
     path('api/users/<int:user_id>/update/', views.update_user_profile, name='update_user_profile'),# PUT
     path('api/users/login/', views.login_user, name='login_user'),# POST
     path('api/users/logout/', views.logout_user, name='logout_user'),# POST
+    path('api/users/logout_all/', views.logout_all_sessions, name='logout_all_sessions'),# POST
+
+    # метрики
+    path('api/metrics/', views.get_metrics, name='get_metrics'),# GET
 
     #swagger
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),